@@ -1,15 +1,24 @@
 from django.contrib.auth import authenticate
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-from ninja import NinjaAPI
-from ninja.pagination import paginate
-from . import models, schemas
+from django.db import IntegrityError, router, transaction
+from django.db.models import Exists, F, OuterRef
+from django.http import Http404, HttpResponse
+from ninja import Query
+from ninja.conf import settings as ninja_settings
+from ninja.pagination import LimitOffsetPagination
+from . import batch, buckets, imports, jobs, models, offboard, revocation, rows, schemas, webhooks
+from .archive import TasksWithArchive
 from .auth import JWTAuth
+from .formats import NegotiatingNinjaAPI
+from .openapi import StaticSwagger
 from .tenant import get_current_organization
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+from typing import Literal
 import jwt
+import uuid
 
-api = NinjaAPI()
+api = NegotiatingNinjaAPI(docs=StaticSwagger())
 
 
 @api.post("auth/login", response={200: schemas.TokenSchema, 401: schemas.MessageSchema})
@@ -19,81 +28,318 @@ def token_obtain(request, payload: schemas.LoginSchema):
     if not user:
         return 401, {"message": "Invalid credentials"}
 
-    exp = datetime.now(timezone.utc) + timedelta(hours=int(settings.JWT_EXPIRATION_HOURS))
-    payload = {"user_id": user.id, "exp": int(exp.timestamp())}
+    now = datetime.now(timezone.utc)
+    exp = now + timedelta(hours=int(settings.JWT_EXPIRATION_HOURS))
+    # jti lets a single token be revoked, iat compares against User.tokens_valid_after
+    payload = {"user_id": user.id, "exp": int(exp.timestamp()), "iat": now.timestamp(), "jti": uuid.uuid4().hex}
     token = jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
 
     return 200, {"token": token, "expires": exp.isoformat()}
 
 
-@api.get("tasks", auth=JWTAuth(), response=list[schemas.TaskSchema])
-@paginate
-def get_tasks(request):
-    return models.Task.objects.select_related('assigned_to', 'organization').all()
+@api.post("auth/logout", auth=JWTAuth(), response={200: schemas.MessageSchema, 400: schemas.MessageSchema})
+def logout(request):
+    if "jti" not in request.jwt_payload:
+        return 400, {"message": "Token has no ID, revoke all tokens of the user instead"}
+
+    revocation.revoke_token(request.jwt_payload)
+    return 200, {"message": "Logged out"}
+
+
+@api.get("tasks", auth=JWTAuth(), response=schemas.PagedTaskSchema)
+def get_tasks(request, include_archived: bool = False, pagination: LimitOffsetPagination.Input = Query(...)):
+    # plain rows rendered as they are: no model instances, and no pydantic pass over data we just read
+    tasks = rows.task_rows(models.Task.objects.all())
+    if include_archived:
+        tasks = TasksWithArchive(tasks, rows.task_rows(models.ArchivedTask.objects.order_by('id')))
+
+    offset = pagination.offset
+    limit = min(pagination.limit, ninja_settings.PAGINATION_MAX_LIMIT)
+    page = {"items": rows.serialize_tasks(tasks[offset:offset + limit]), "count": tasks.count()}
+    return api.create_response(request, page)
+
+@api.get("tasks/calendar", auth=JWTAuth(), response={200: schemas.TaskCalendarSchema, 400: schemas.MessageSchema})
+def get_task_calendar(request, start: date = Query(..., alias="from"), end: date = Query(..., alias="to"),
+                      bucket: Literal['day', 'week'] = 'day', tz: str = 'UTC'):
+    try:
+        return 200, buckets.deadline_buckets(start, end, bucket, buckets.parse_zone(tz))
+    except ValueError as e:
+        return 400, {"message": str(e)}
 
 @api.post("tasks", auth=JWTAuth(), response={200: schemas.TaskCreatedSchema, 403: schemas.MessageSchema, 500: schemas.MessageSchema})
 def create_task(request, payload: schemas.TaskInputSchema):
     try:
-        task = models.Task.objects.create(
-            title=payload.title,
-            description=payload.description,
-            completed=payload.completed,
-            deadline_datetime_with_tz=payload.deadline_datetime_with_tz,
-            priority=payload.priority,
-            assigned_to_id=payload.assigned_to,
-            organization_id=request.user.organization.id)
+        with webhooks.publishing(request.user.organization.id, webhooks.TASK_CREATED) as events:
+            task = models.Task.objects.create(
+                title=payload.title,
+                description=payload.description,
+                completed=payload.completed,
+                deadline_datetime_with_tz=payload.deadline_datetime_with_tz,
+                priority=payload.priority,
+                assigned_to_id=payload.assigned_to,
+                organization_id=request.user.organization.id)
+            events.append(webhooks.task_data(task))
 
         # task.save()
-        return 200, {"task_id": task.id}
+        return 200, {"task_id": task.id, "version": task.version}
     except ValueError as e:
         return 403, {"message": str(e)}
     except Exception as e:
         return 500, {"message": str(e)}
 
+@api.post("tasks/import", auth=JWTAuth(), response={200: schemas.TaskImportResultSchema, 415: schemas.MessageSchema})
+def import_tasks(request):
+    # the body is read line by line from the socket, never buffered whole
+    content_type = request.content_type
+    if content_type in imports.NDJSON_TYPES:
+        parsed = imports.ndjson_rows(request)
+    elif content_type in imports.CSV_TYPES:
+        parsed = imports.csv_rows(request)
+    else:
+        return 415, {"message": "Send application/x-ndjson or text/csv"}
+
+    return 200, imports.TaskImporter(request.user.organization).run(parsed)
+
+
+def _expected_version(request, payload_version):
+    """Version the client last saw, from If-Match ("3", W/"3") or the payload."""
+    header = request.headers.get('If-Match')
+    if header is None or header.strip() == '*':
+        return payload_version
+
+    value = header.strip().removeprefix('W/').strip('"')
+    if not value.isdigit():
+        raise ValueError("If-Match must be a task version")
+    return int(value)
+
+
+def _update_task_fields(task_id, fields, expected_version=None):
+    """
+    Write `fields` with a single tenant-filtered UPDATE. A new assignee is
+    checked inside the same statement and an expected version turns it into a
+    compare-and-swap, so the happy path costs one query and the 404/409/403
+    distinction is only looked up when nothing was updated.
+    """
+    tasks = models.Task.objects.filter(id=task_id)
+
+    if expected_version is not None:
+        tasks = tasks.filter(version=expected_version)
+
+    assignee_id = fields.get('assigned_to_id')
+    if assignee_id is not None:
+        tasks = tasks.filter(Exists(models.User.all_objects.filter(
+            id=assignee_id,
+            organization_id=OuterRef('organization_id')
+        )))
+
+    with webhooks.publishing(get_current_organization().id, webhooks.TASK_UPDATED) as events:
+        updated = tasks.update_returning(
+            ['version'], **fields, version=F('version') + 1, updated_at=datetime.now(timezone.utc)
+        )
+        version = updated[0][0] if updated else None
+        if version is not None:
+            changes = {"assigned_to" if name == 'assigned_to_id' else name: value for name, value in fields.items()}
+            events.append({"id": task_id, **changes, "version": version})
+
+    if version is not None:
+        return 200, {"task_id": task_id, "version": version}
+
+    current_version = models.Task.objects.filter(id=task_id).values_list('version', flat=True).first()
+    if current_version is None:
+        raise Http404("No Task matches the given query.")
+    if expected_version is not None and current_version != expected_version:
+        return 409, {"message": f"Task was modified concurrently, current version is {current_version}"}
+    return 403, {"message": "Cannot assign task to user from different organization"}
+
+
+def _write_response(response, result):
+    status, body = result
+    if status == 200 and body.get("version") is not None:
+        response["ETag"] = f'"{body["version"]}"'
+    return result
+
 
-@api.put("tasks/{task_id}", auth=JWTAuth(), response={200: schemas.TaskCreatedSchema, 403: schemas.MessageSchema, 500: schemas.MessageSchema})
-def update_task(request, task_id: int, payload: schemas.TaskInputSchema):
-    task = get_object_or_404(models.Task, id=task_id)
-    
-    task.title=payload.title
-    task.description=payload.description
-    task.completed=payload.completed
-    task.deadline_datetime_with_tz=payload.deadline_datetime_with_tz
-    task.priority=payload.priority
-    task.assigned_to_id=payload.assigned_to
-
-    try: 
-        task.save()
-        return 200, {"task_id": task.id}
+@api.put("tasks/{task_id}", auth=JWTAuth(), response={200: schemas.TaskCreatedSchema, 400: schemas.MessageSchema, 403: schemas.MessageSchema, 409: schemas.MessageSchema, 500: schemas.MessageSchema})
+def update_task(request, response: HttpResponse, task_id: int, payload: schemas.TaskInputSchema):
+    try:
+        expected_version = _expected_version(request, payload.version)
     except ValueError as e:
-        return 403, {"message": str(e)}
+        return 400, {"message": str(e)}
+
+    try:
+        return _write_response(response, _update_task_fields(task_id, {
+            "title": payload.title,
+            "description": payload.description,
+            "completed": payload.completed,
+            "deadline_datetime_with_tz": payload.deadline_datetime_with_tz,
+            "priority": payload.priority,
+            "assigned_to_id": payload.assigned_to,
+        }, expected_version))
+    except Http404:
+        raise
     except Exception as e:
         return 500, {"message": str(e)}
 
+
+@api.patch("tasks/{task_id}", auth=JWTAuth(), response={200: schemas.TaskCreatedSchema, 400: schemas.MessageSchema, 403: schemas.MessageSchema, 409: schemas.MessageSchema, 500: schemas.MessageSchema})
+def patch_task(request, response: HttpResponse, task_id: int, payload: schemas.TaskPatchSchema):
+    fields = payload.dict(exclude_unset=True)
+    if "assigned_to" in fields:
+        fields["assigned_to_id"] = fields.pop("assigned_to")
+
+    try:
+        expected_version = _expected_version(request, fields.pop("version", None))
+    except ValueError as e:
+        return 400, {"message": str(e)}
+
+    try:
+        return _write_response(response, _update_task_fields(task_id, fields, expected_version))
+    except Http404:
+        raise
+    except Exception as e:
+        return 500, {"message": str(e)}
+
+
 @api.delete("tasks/{task_id}", auth=JWTAuth(), response={200: schemas.MessageSchema})
 def delete_task(request, task_id: int):
-    task = get_object_or_404(models.Task, id=task_id)
-    task.delete()
+    # Task has no dependent rows or delete signals, so this is one DELETE without a prior SELECT
+    with webhooks.publishing(request.user.organization.id, webhooks.TASK_DELETED) as events:
+        deleted, _ = models.Task.objects.filter(id=task_id).delete()
+        if deleted:
+            events.append({"id": task_id})
+    if not deleted:
+        raise Http404("No Task matches the given query.")
 
     return 200, {"message": "Task deleted"}
 
 
 @api.get("users/", auth=JWTAuth(), response=list[schemas.UserSchema])
 def get_users(request):
-    return models.User.objects.all()
+    return models.User.objects.select_related('organization')
 
 
 @api.post("users/", auth=JWTAuth(), response={200: schemas.UserCreatedSchema, 400: schemas.MessageSchema})
 def create_user(request, payload: schemas.LoginSchema):
-    if models.User.objects.filter(username=payload.username).exists():
-        return 400, {"message": "Username already exists"}
-
+    # the unique username constraint decides races, no exists() pre-check
     try:
-        user = models.User.objects.create_user(
-            username=payload.username,
-            password=payload.password,
-            organization=get_current_organization()
-        )
+        with transaction.atomic(using=router.db_for_write(models.User)):
+            user = models.User.objects.create_user(
+                username=payload.username,
+                password=payload.password,
+                organization=get_current_organization()
+            )
         return 200, {"user_id": user.id}
+    except IntegrityError:
+        return 400, {"message": "Username already exists"}
     except Exception as e:
         return 400, {"message": str(e)}
+
+
+@api.post("users/{user_id}/revoke-tokens", auth=JWTAuth(), response={200: schemas.MessageSchema, 403: schemas.MessageSchema, 404: schemas.MessageSchema})
+def revoke_user_tokens(request, user_id: int):
+    # anyone may log themselves out everywhere, only staff may do it for others
+    if user_id != request.user.id and not request.user.is_staff:
+        return 403, {"message": "Only administrators can revoke other users' tokens"}
+    if not revocation.revoke_user_tokens(user_id):
+        return 404, {"message": "User not found"}
+
+    return 200, {"message": "Tokens revoked"}
+
+
+@api.post("batch", auth=JWTAuth(), response={200: list[schemas.BatchResultSchema], 400: schemas.MessageSchema})
+def run_batch(request, payload: schemas.BatchSchema):
+    if not payload.operations:
+        return 400, {"message": "No operations given"}
+    if len(payload.operations) > settings.BATCH_MAX_OPERATIONS:
+        return 400, {"message": f"At most {settings.BATCH_MAX_OPERATIONS} operations per batch"}
+
+    root = request.path[:-len("batch")]
+    return 200, batch.run_batch(request, root, request.resolver_match.func, payload.operations, atomic=payload.atomic)
+
+
+@api.get("jobs/{job_id}", auth=JWTAuth(), response=schemas.JobSchema)
+def get_job(request, job_id: int):
+    return get_object_or_404(models.Job, id=job_id)
+
+
+@api.post("users/{user_id}/offboard", auth=JWTAuth(), response={200: schemas.OffboardResultSchema, 400: schemas.MessageSchema, 403: schemas.MessageSchema, 404: schemas.MessageSchema})
+def offboard_user(request, user_id: int, payload: schemas.OffboardSchema):
+    if not request.user.is_staff:
+        return 403, {"message": "Only administrators can offboard users"}
+    if user_id == request.user.id:
+        return 400, {"message": "Cannot offboard yourself"}
+    if not models.User.objects.filter(id=user_id).exists():
+        return 404, {"message": "User not found"}
+
+    if payload.reassign_to is not None:
+        if payload.reassign_to == user_id or not models.User.objects.filter(id=payload.reassign_to, is_active=True).exists():
+            return 400, {"message": "Tasks can only be reassigned to another active user of your organization"}
+
+    reassigned = offboard.offboard_user(user_id, payload.reassign_to)
+    return 200, {"user_id": user_id, "reassigned_tasks": reassigned}
+
+
+@api.delete("organizations/{organization_id}", auth=JWTAuth(), response={202: schemas.JobAcceptedSchema, 400: schemas.MessageSchema, 403: schemas.MessageSchema, 404: schemas.MessageSchema})
+def delete_organization(request, organization_id: int):
+    if not request.user.is_superuser:
+        return 403, {"message": "Only administrators can delete organizations"}
+    if organization_id == request.user.organization_id:
+        return 400, {"message": "Cannot delete your own organization"}
+
+    # marking it first locks its users out while the purge job runs
+    if not models.Organization.objects.filter(id=organization_id).update(purge_started_at=datetime.now(timezone.utc)):
+        return 404, {"message": "Organization not found"}
+
+    job = jobs.enqueue(
+        "organizations.purge",
+        organization=request.user.organization,
+        payload={"organization_id": organization_id},
+    )
+    return 202, {"job_id": job.id}
+
+
+
+@api.get("webhooks", auth=JWTAuth(), response={200: list[schemas.WebhookSubscriptionSchema], 403: schemas.MessageSchema})
+def get_webhooks(request):
+    if not request.user.is_staff:
+        return 403, {"message": "Only administrators can manage webhooks"}
+    return 200, models.WebhookSubscription.objects.order_by('id')
+
+
+@api.post("webhooks", auth=JWTAuth(), response={200: schemas.WebhookSubscriptionCreatedSchema, 400: schemas.MessageSchema, 403: schemas.MessageSchema})
+def create_webhook(request, payload: schemas.WebhookSubscriptionInputSchema):
+    if not request.user.is_staff:
+        return 403, {"message": "Only administrators can manage webhooks"}
+    # checked again on every send, the name may resolve differently by then
+    try:
+        webhooks.check_url(payload.url)
+    except ValueError as e:
+        return 400, {"message": str(e)}
+    unknown = sorted(set(payload.event_types) - set(webhooks.EVENT_TYPES))
+    if unknown:
+        return 400, {"message": f"Unknown event types {', '.join(unknown)}, use {', '.join(webhooks.EVENT_TYPES)}"}
+    if not 1 <= payload.max_concurrency <= settings.WEBHOOK_MAX_CONCURRENCY:
+        return 400, {"message": f"max_concurrency must be between 1 and {settings.WEBHOOK_MAX_CONCURRENCY}"}
+
+    subscription = models.WebhookSubscription.objects.create(
+        organization=request.user.organization,
+        url=payload.url,
+        secret=webhooks.generate_secret(),
+        event_types=payload.event_types,
+        max_concurrency=payload.max_concurrency,
+    )
+    # every process starts writing events with its next write
+    webhooks.subscriptions_changed(request.user.organization.id)
+    # the only time the secret is shown
+    return 200, {"id": subscription.id, "secret": subscription.secret}
+
+
+@api.delete("webhooks/{subscription_id}", auth=JWTAuth(), response={200: schemas.MessageSchema, 403: schemas.MessageSchema, 404: schemas.MessageSchema})
+def delete_webhook(request, subscription_id: int):
+    if not request.user.is_staff:
+        return 403, {"message": "Only administrators can manage webhooks"}
+    if not models.WebhookSubscription.objects.filter(id=subscription_id).delete()[0]:
+        return 404, {"message": "Webhook not found"}
+
+    webhooks.subscriptions_changed(request.user.organization.id)
+    return 200, {"message": "Webhook deleted"}
@@ -2,4 +2,17 @@ from django.apps import AppConfig
 
 
 class ApiConfig(AppConfig):
-    name = 'api'
\ No newline at end of file
+    name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate, post_save
+
+        # job handlers and system checks register themselves on import
+        from . import archive, checks, purge  # noqa: F401
+        from . import sharding, slowlog
+        from .models import User
+
+        post_save.connect(sharding.update_directory, sender=User, dispatch_uid="api.user_directory")
+        post_migrate.connect(sharding.reserve_id_range, sender=self, dispatch_uid="api.shard_id_range")
+        connection_created.connect(slowlog.install, dispatch_uid="api.slow_query_log")
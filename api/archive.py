@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import sharding, webhooks
+from .jobs import job, report_progress
+from .models import ArchivedTask, Organization, Task
+
+ARCHIVED_FIELDS = [
+    'id', 'title', 'description', 'completed', 'assigned_to_id', 'organization_id',
+    'created_at', 'updated_at', 'deadline_datetime_with_tz', 'priority', 'version',
+]
+
+
+def retention_for(org):
+    days = org.task_retention_days
+    return timedelta(days=settings.TASK_ARCHIVE_RETENTION_DAYS if days is None else days)
+
+
+def archive_organization(org, batch_size=1000, now=None):
+    """
+    Move completed tasks untouched for the organization's retention period
+    into ArchivedTask, one bounded transaction per batch, which also
+    publishes a task.archived event per task.
+    """
+    cutoff = (now or timezone.now()) - retention_for(org)
+    using = sharding.shard_for(org.id)
+    archived = 0
+
+    while True:
+        with transaction.atomic(using=using), webhooks.publishing(org.id, webhooks.TASK_ARCHIVED) as events:
+            rows = list(
+                Task.all_objects.using(using).select_for_update()
+                .filter(organization=org, completed=True, updated_at__lt=cutoff)
+                .order_by('id')
+                .values(*ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return archived
+
+            ArchivedTask.all_objects.using(using).bulk_create([ArchivedTask(**row) for row in rows])
+            Task.all_objects.using(using).filter(id__in=[row['id'] for row in rows]).delete()
+            events.extend({"id": row['id']} for row in rows)
+        archived += len(rows)
+
+
+def archive_completed_tasks(organization=None, batch_size=1000, now=None, progress=None):
+    orgs = [organization] if organization is not None else Organization.objects.order_by('id').iterator()
+    archived = 0
+
+    for org in orgs:
+        count = archive_organization(org, batch_size=batch_size, now=now)
+        archived += count
+        if progress:
+            progress(org, count, archived)
+
+    return archived
+
+
+@job("tasks.archive")
+def archive_tasks_job(job, batch_size=1000):
+    archived = archive_completed_tasks(
+        organization=job.organization,
+        batch_size=batch_size,
+        progress=lambda org, count, archived: report_progress(job, archived),
+    )
+    return {"archived": archived}
+
+
+class TasksWithArchive:
+    """
+    Hot tasks followed by archived ones, sliceable and countable the way
+    Ninja's LimitOffsetPagination expects a queryset to be.
+    """
+
+    def __init__(self, hot, archived):
+        self.hot = hot
+        self.archived = archived
+        self._hot_count = None
+
+    def all(self):
+        return self
+
+    def hot_count(self):
+        if self._hot_count is None:
+            self._hot_count = self.hot.count()
+        return self._hot_count
+
+    def count(self):
+        return self.hot_count() + self.archived.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            items = self[key:key + 1]
+            if not items:
+                raise IndexError("Task index out of range")
+            return items[0]
+        if not isinstance(key, slice):
+            raise TypeError(f"Tasks must be indexed by integers or slices, not {type(key).__name__}")
+        if key.step is not None:
+            raise ValueError("Stepped slices are not supported")
+        start, stop = key.start or 0, key.stop
+        if start < 0 or (stop is not None and stop < 0):
+            raise ValueError("Negative indexing is not supported")
+
+        hot_count = self.hot_count()
+        items = []
+        if start < hot_count:
+            items += self.hot[start:hot_count if stop is None else min(stop, hot_count)]
+        if stop is None:
+            items += self.archived[max(0, start - hot_count):]
+        elif stop > hot_count:
+            items += self.archived[max(0, start - hot_count):stop - hot_count]
+        return items
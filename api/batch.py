@@ -0,0 +1,129 @@
+import json
+import logging
+import math
+import time
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import router, transaction
+from django.urls import Resolver404, resolve
+
+from . import metrics, ratelimit, sharding
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# the body is inlined as JSON, its framing headers don't apply
+SKIPPED_HEADERS = {'content-type', 'content-length'}
+
+
+def _sub_request(request, method, path, body, headers):
+    url = urlsplit(path)
+    content = b"" if body is None else json.dumps(body).encode()
+
+    environ = request.META.copy()
+    for name, value in headers.items():
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key not in ('HTTP_AUTHORIZATION', 'HTTP_IDEMPOTENCY_KEY'):
+            environ[key] = value
+    environ.update({
+        'REQUEST_METHOD': method.upper(),
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        # results are embedded as JSON whatever the batch itself is answered in
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': BytesIO(content),
+    })
+    environ.pop('HTTP_IDEMPOTENCY_KEY', None)
+
+    sub = WSGIRequest(environ)
+    # authenticated once by the middleware for the whole batch
+    sub.user = request.user
+    sub.jwt_error = None
+    sub.jwt_payload = request.jwt_payload
+    return sub
+
+
+def _result(response):
+    body = None
+    if response.content:
+        try:
+            body = json.loads(response.content)
+        except ValueError:
+            body = response.content.decode(errors='replace')
+
+    return {
+        "status": response.status_code,
+        "headers": {key: value for key, value in response.items() if key.lower() not in SKIPPED_HEADERS},
+        "body": body,
+    }
+
+
+def _error(status, message, headers=None):
+    return {"status": status, "headers": headers or {}, "body": {"message": message}}
+
+
+def _admit(org, method):
+    """The checks OrganizationContextMiddleware runs per request, applied to one operation. Returns an error or None."""
+    if method not in ('GET', 'HEAD', 'OPTIONS') and sharding.is_frozen(org.id):
+        return _error(503, "Organization is being moved, try again shortly",
+                      {"Retry-After": str(settings.SHARD_MAP_CACHE_SECONDS or 1)})
+    retry_after = ratelimit.charge(org)
+    if retry_after is not None:
+        return _error(429, "Too many requests for this organization",
+                      {"Retry-After": str(max(1, math.ceil(retry_after)))})
+    return None
+
+
+def run_operation(request, root, batch_view, operation):
+    path = root + operation.path.lstrip('/')
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return _error(404, "Not Found")
+
+    if match.func is batch_view:
+        return _error(400, "Batches cannot be nested")
+
+    org = request.user.organization
+    method = operation.method.upper()
+    error = _admit(org, method)
+    if error is not None:
+        return error
+
+    sub = _sub_request(request, operation.method, path, operation.body, operation.headers)
+    start = time.perf_counter()
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception("Batch operation %s %s failed", method, path)
+        return _error(500, "Internal server error")
+    if settings.METRICS_ENABLED:
+        metrics.inc("http_requests_total", route=match.route, method=method, status=response.status_code, tier=org.tier)
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - start,
+                        route=match.route, method=method, tier=org.tier)
+    return _result(response)
+
+
+def run_batch(request, root, batch_view, operations, atomic=False):
+    """
+    Run `operations` in order through the regular API views. With `atomic`
+    the batch stops at the first 4xx/5xx result and every write is rolled back.
+    """
+    if not atomic:
+        return [run_operation(request, root, batch_view, operation) for operation in operations]
+
+    results = []
+    # tasks and users live on the organization's shard
+    with transaction.atomic(using=router.db_for_write(Task)):
+        for operation in operations:
+            result = run_operation(request, root, batch_view, operation)
+            results.append(result)
+            if result["status"] >= 400:
+                transaction.set_rollback(True)
+                break
+    return results
@@ -0,0 +1,69 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Aggregate, Count, JSONField
+from django.db.models.functions import TruncDay, TruncWeek
+
+from .models import Task
+
+TRUNCATE = {'day': TruncDay, 'week': TruncWeek}
+
+
+class JSONGroupArray(Aggregate):
+    """Values of a group as a JSON array (SQLite's json_group_array, MySQL's JSON_ARRAYAGG)."""
+
+    function = 'JSON_GROUP_ARRAY'
+    output_field = JSONField()
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='JSON_ARRAYAGG', **extra_context)
+
+
+def task_ids(vendor):
+    if vendor == 'postgresql':
+        # needs psycopg, so only imported on PostgreSQL
+        from django.contrib.postgres.aggregates import ArrayAgg
+        return ArrayAgg('id', order_by='id')
+    return JSONGroupArray('id')
+
+
+def parse_zone(name):
+    """ZoneInfo for an IANA name, ValueError if there is no such zone."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone {name!r}")
+
+
+def deadline_buckets(start, end, bucket, zone):
+    """
+    Tasks with a deadline between the dates `start` and `end` (both included,
+    in `zone`) grouped by the day or week (from Monday) of their deadline in
+    `zone`, in one query over the organization's deadline index. Returns
+    column arrays of the non-empty buckets: their first days, task counts
+    and sorted task ids.
+    """
+    if end < start:
+        raise ValueError("'to' is before 'from'")
+    if (end - start).days >= settings.TASK_CALENDAR_MAX_DAYS:
+        raise ValueError(f"At most {settings.TASK_CALENDAR_MAX_DAYS} days can be queried at once")
+
+    tasks = Task.objects.filter(
+        deadline_datetime_with_tz__gte=datetime.combine(start, time.min, tzinfo=zone),
+        deadline_datetime_with_tz__lt=datetime.combine(end + timedelta(days=1), time.min, tzinfo=zone),
+    )
+    rows = (
+        tasks.annotate(bucket=TRUNCATE[bucket]('deadline_datetime_with_tz', tzinfo=zone))
+        .values('bucket')
+        .annotate(count=Count('id'), ids=task_ids(connections[tasks.db].vendor))
+        .order_by('bucket')
+    )
+
+    result = {"bucket": bucket, "tz": zone.key, "starts": [], "counts": [], "task_ids": []}
+    for row in rows:
+        result["starts"].append(row["bucket"].astimezone(zone).date())
+        result["counts"].append(row["count"])
+        result["task_ids"].append(sorted(row["ids"]))
+    return result
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.db import BaseDatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+# incr() on these reads and writes back the value, concurrent requests lose updates
+NON_ATOMIC_CACHES = (BaseDatabaseCache, DummyCache, FileBasedCache)
+
+
+@checks.register(checks.Tags.caches)
+def check_rate_limit_cache(app_configs, **kwargs):
+    if not settings.RATE_LIMIT_ENABLED:
+        return []
+    cache = caches[settings.RATE_LIMIT_CACHE]
+    if isinstance(cache, NON_ATOMIC_CACHES):
+        return [
+            checks.Error(
+                f"The {settings.RATE_LIMIT_CACHE!r} cache ({type(cache).__name__}) can't increment atomically, "
+                "rate limits would under-count concurrent requests.",
+                hint="Use RedisCache or PyMemcacheCache, or leave RATE_LIMIT_CACHE_BACKEND unset "
+                "to limit each worker process on its own.",
+                id="api.E001",
+            )
+        ]
+    return []
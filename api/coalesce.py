@@ -0,0 +1,176 @@
+import asyncio
+import threading
+from urllib.parse import parse_qsl, urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import metrics
+from .profiling import HEADER as PROFILE_HEADER
+
+# response headers that describe the leader's request only
+PRIVATE_HEADERS = {'x-profile-id'}
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """
+    In-flight computations by key: the first caller of a key runs it, callers
+    arriving while it runs wait for its result instead of running it again.
+    Nothing is kept once it finishes, this is not a cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        # organization id -> writes finished in this process, see key_for
+        self._generations = {}
+
+    def generation(self, organization_id):
+        return self._generations.get(organization_id, 0)
+
+    def wrote(self, organization_id):
+        with self._lock:
+            self._generations[organization_id] = self._generations.get(organization_id, 0) + 1
+
+    def join(self, key, factory):
+        """(flight, True) for the caller that has to run it, (flight, False) for the ones waiting."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = factory()
+            return flight, True
+
+    def land(self, key):
+        with self._lock:
+            self._flights.pop(key, None)
+
+
+flights = SingleFlight()
+
+
+def key_for(request):
+    """Identity of a coalescable request, or None when it has to run on its own."""
+    if not settings.COALESCE_ENABLED:
+        return None
+    if request.method != 'GET' or request.path not in settings.COALESCE_PATHS:
+        return None
+    organization = getattr(getattr(request, 'user', None), 'organization', None)
+    if organization is None:
+        return None
+    if PROFILE_HEADER in request.headers or 'no-cache' in request.headers.get('Cache-Control', ''):
+        return None
+
+    query = urlencode(sorted(parse_qsl(request.META.get('QUERY_STRING', ''), keep_blank_values=True)))
+    # the write generation makes a read issued after a write (as seen by this process) start a new flight,
+    # so no client reads data from before its own write
+    return (
+        organization.id,
+        flights.generation(organization.id),
+        request.path,
+        query,
+        request.headers.get('Accept', ''),
+    )
+
+
+def snapshot(response):
+    if response.streaming:
+        return None
+    headers = [(name, value) for name, value in response.items() if name.lower() not in PRIVATE_HEADERS]
+    return response.status_code, headers, response.content
+
+
+def replay(result, request):
+    status, headers, content = result
+    response = HttpResponse(content, status=status)
+    for name, value in headers:
+        response[name] = value
+    response['X-Coalesced'] = 'true'
+    metrics.inc("coalesced_requests_total", route=request.path)
+    return response
+
+
+class CoalescingMiddleware:
+    """
+    Identical concurrent GETs of one organization (same path, query string
+    and Accept header) share a single run of the view and its serialized
+    body. Only paths in COALESCE_PATHS take part. Requests wait at most
+    COALESCE_WAIT_SECONDS for the running one before running themselves.
+    Works with threaded WSGI workers and, when the middleware above it is
+    async, with ASGI ones.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _wrote(self, request):
+        organization = getattr(getattr(request, 'user', None), 'organization', None)
+        if organization is not None and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            flights.wrote(organization.id)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        key = key_for(request)
+        if key is None:
+            try:
+                return self.get_response(request)
+            finally:
+                self._wrote(request)
+
+        flight, leader = flights.join(key, Flight)
+        if not leader:
+            if flight.done.wait(settings.COALESCE_WAIT_SECONDS) and flight.result is not None:
+                return replay(flight.result, request)
+            return self.get_response(request)
+
+        try:
+            response = self.get_response(request)
+            flight.result = snapshot(response)
+            return response
+        finally:
+            flights.land(key)
+            flight.done.set()
+
+    async def __acall__(self, request):
+        key = key_for(request)
+        if key is None:
+            try:
+                return await self.get_response(request)
+            finally:
+                self._wrote(request)
+
+        loop = asyncio.get_running_loop()
+        # futures belong to one event loop
+        flight, leader = flights.join((id(loop), key), loop.create_future)
+        if not leader:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(flight), settings.COALESCE_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                result = None
+            if result is not None:
+                return replay(result, request)
+            return await self.get_response(request)
+
+        result = None
+        try:
+            response = await self.get_response(request)
+            result = snapshot(response)
+            return response
+        finally:
+            flights.land((id(loop), key))
+            flight.set_result(result)
@@ -0,0 +1,192 @@
+import importlib
+import zlib
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+# brotli and zstandard are optional (pip install brotli zstandard) and only
+# imported when a response is first compressed with them
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        # sync flush: everything so far becomes decodable without ending the stream
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, level):
+        brotli = importlib.import_module("brotli")
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self, level):
+        self._zstandard = importlib.import_module("zstandard")
+        self._compressor = self._zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(self._zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush(self._zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encoders():
+    """Encoders this process can use, in server preference order."""
+    encoders = {}
+    if find_spec("zstandard") is not None:
+        encoders["zstd"] = ZstdEncoder
+    if find_spec("brotli") is not None:
+        encoders["br"] = BrotliEncoder
+    encoders["gzip"] = GzipEncoder
+    return encoders
+
+
+ENCODERS = available_encoders()
+
+
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(header, encoders=None):
+    """Best encoding both sides support: client q-value first, server preference on ties."""
+    encoders = ENCODERS if encoders is None else encoders
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+
+    best, best_q = None, 0.0
+    for name in encoders:
+        q = accepted.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def level_for(content_type, encoding):
+    mime = content_type.split(";", 1)[0].strip().lower()
+    levels = settings.COMPRESSION_LEVELS.get(mime)
+    if levels is None:
+        return None
+    return levels.get(encoding)
+
+
+def _compress_stream(chunks, encoder):
+    for chunk in chunks:
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+async def _compress_async_stream(chunks, encoder):
+    async for chunk in chunks:
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best of zstd, br and gzip the client
+    accepts. Only content types listed in COMPRESSION_LEVELS are compressed,
+    at the level configured for that type; buffered bodies below
+    COMPRESSION_MIN_SIZE are left alone. Streaming bodies are compressed
+    chunk by chunk, flushing after each one so clients still see every chunk
+    as soon as it is sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        if response.has_header("Content-Encoding") or response.status_code in (204, 304):
+            return response
+        if "no-transform" in response.get("Cache-Control", ""):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        content_type = response.get("Content-Type", "")
+        if not any(level_for(content_type, name) is not None for name in ENCODERS):
+            return response
+
+        # the body now depends on Accept-Encoding even when this client gets it uncompressed
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = negotiate(request.headers.get("Accept-Encoding", ""))
+        level = level_for(content_type, encoding) if encoding else None
+        if level is None:
+            return response
+
+        encoder = ENCODERS[encoding](level)
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _compress_async_stream(response.streaming_content, encoder)
+            else:
+                response.streaming_content = _compress_stream(response.streaming_content, encoder)
+            del response["Content-Length"]
+        else:
+            compressed = encoder.compress(response.content) + encoder.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # the representation changed, so a strong validator no longer matches it byte for byte
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+
+        response["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,22 @@
+def delete_in_batches(queryset, batch_size, progress=None):
+    """
+    Delete `queryset` in primary key ranges of at most `batch_size` rows, each
+    range in its own short statement, so neither memory nor lock time grows
+    with the number of rows.
+    """
+    deleted = 0
+    last_id = 0
+
+    while True:
+        remaining = queryset.filter(id__gt=last_id).order_by('id')
+        upper = remaining.values_list('id', flat=True)[batch_size - 1:batch_size].first()
+
+        chunk = remaining if upper is None else remaining.filter(id__lte=upper)
+        count = chunk.order_by().delete()[1].get(queryset.model._meta.label, 0)
+        deleted += count
+        if progress and count:
+            progress(count)
+
+        if upper is None:
+            return deleted
+        last_id = upper
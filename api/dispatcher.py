@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import socket
+import ssl
+import time
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+
+from . import webhooks
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "task-api-webhooks/1"
+
+
+async def post(url, body, headers, timeout):
+    """
+    POST `body` over a fresh HTTP/1.1 connection and return (status, Retry-After
+    seconds or None). Only the status line and headers are read, receivers
+    have nothing to tell us in the body. Hosts resolving to addresses
+    webhooks.is_allowed_address refuses raise ValueError.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Unsupported webhook URL {url!r}")
+    tls = ssl.create_default_context() if parts.scheme == "https" else None
+    port = parts.port or (443 if tls else 80)
+    # never the userinfo of the URL
+    host = f"[{parts.hostname}]" if ":" in parts.hostname else parts.hostname
+    if parts.port is not None:
+        host = f"{host}:{parts.port}"
+
+    async def exchange():
+        # connect to the address that was checked, so a DNS answer changing in between can't point us inside
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        addresses = [sockaddr[0] for *_, sockaddr in infos]
+        webhooks.check_addresses(parts.hostname, addresses)
+        reader, writer = await asyncio.open_connection(
+            addresses[0], port, ssl=tls, server_hostname=parts.hostname if tls else None
+        )
+        try:
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            lines = [
+                f"POST {target} HTTP/1.1",
+                f"Host: {host}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}",
+                f"User-Agent: {USER_AGENT}",
+                "Connection: close",
+                *(f"{name}: {value}" for name, value in headers.items()),
+            ]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            try:
+                status = int(status_line.split()[1])
+            except (IndexError, ValueError):
+                raise ValueError(f"Malformed response {status_line[:100]!r}")
+
+            retry_after = None
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "retry-after" and value.strip().isdigit():
+                    retry_after = int(value.strip())
+            return status, retry_after
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+def batches(deliveries, size):
+    """Deliveries grouped per subscription, at most `size` per request."""
+    per_subscription = {}
+    for delivery in deliveries:
+        per_subscription.setdefault(delivery.subscription_id, []).append(delivery)
+    return [
+        group[start:start + size]
+        for group in per_subscription.values()
+        for start in range(0, len(group), size)
+    ]
+
+
+class Dispatcher:
+    """
+    Relays the outbox of every database into deliveries and sends them as
+    signed JSON batches, one request per subscription and batch, all
+    requests of a round concurrently on one event loop. WEBHOOK_MAX_CONCURRENCY
+    caps requests in flight overall and each subscription's max_concurrency
+    those to its endpoint. Each request's outcome is stored as soon as it
+    finishes, not at the end of the round. Failed requests are retried with
+    exponential backoff up to WEBHOOK_MAX_ATTEMPTS. Delivery is at least
+    once, receivers should ignore event ids they have already seen.
+    """
+
+    def __init__(self, dispatcher_id=None, batch_size=None, concurrency=None, timeout=None):
+        self.dispatcher_id = dispatcher_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+        self.concurrency = concurrency or settings.WEBHOOK_MAX_CONCURRENCY
+        self.timeout = timeout or settings.WEBHOOK_TIMEOUT_SECONDS
+
+    def relay(self):
+        relayed = 0
+        for using in webhooks.databases():
+            while count := webhooks.relay(using):
+                relayed += count
+        return relayed
+
+    def tick(self):
+        """Relay, then send one round of due deliveries. Returns how many were attempted."""
+        self.relay()
+        deliveries = webhooks.claim(self.dispatcher_id, self.batch_size * self.concurrency, self.batch_size)
+        if not deliveries:
+            return 0
+
+        # HTTP runs on an event loop in another thread, the ORM calls are
+        # handed back to this one (thread-sensitive sync_to_async)
+        async_to_sync(self.send_all)(batches(deliveries, self.batch_size))
+        return len(deliveries)
+
+    async def send_all(self, groups):
+        overall = asyncio.Semaphore(self.concurrency)
+        per_endpoint = {}
+        for group in groups:
+            subscription = group[0].subscription
+            if subscription.id not in per_endpoint:
+                per_endpoint[subscription.id] = asyncio.Semaphore(max(1, subscription.max_concurrency))
+        record_result = sync_to_async(webhooks.record_result)
+
+        async def send(group):
+            async with per_endpoint[group[0].subscription_id], overall:
+                result = await self.send(group)
+            await record_result(group, **result)
+
+        await asyncio.gather(*(send(group) for group in groups))
+
+    async def send(self, group):
+        subscription = group[0].subscription
+        body = webhooks.render_batch(group)
+        headers = {webhooks.SIGNATURE_HEADER: webhooks.sign(subscription.secret, int(time.time()), body)}
+        try:
+            status, retry_after = await post(subscription.url, body, headers, self.timeout)
+        except asyncio.TimeoutError:
+            return {"error": f"No response within {self.timeout}s"}
+        except (OSError, ValueError) as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        if not 200 <= status < 300:
+            logger.info("Webhook %s answered %s for %s events", subscription.url, status, len(group))
+        return {"status": status, "retry_after": retry_after, "error": "" if status < 300 else f"HTTP {status}"}
+
+    def run_forever(self, poll_interval=None, should_stop=lambda: False):
+        poll_interval = settings.WEBHOOK_POLL_INTERVAL if poll_interval is None else poll_interval
+        while not should_stop():
+            try:
+                sent = self.tick()
+            except Exception:
+                logger.exception("Webhook dispatch round failed")
+                sent = 0
+            if not sent:
+                time.sleep(poll_interval)
@@ -0,0 +1,96 @@
+import functools
+from datetime import datetime
+from importlib.util import find_spec
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from ninja import NinjaAPI
+from ninja.parser import Parser
+from ninja.renderers import JSONRenderer
+from ninja.responses import NinjaJSONEncoder
+
+from .compression import parse_accept_encoding
+
+# optional, pip install msgpack; imported on first use
+MSGPACK_AVAILABLE = find_spec('msgpack') is not None
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+MSGPACK_TYPE = MSGPACK_TYPES[0]
+
+_json_encoder = NinjaJSONEncoder()
+
+
+@functools.cache
+def get_msgpack():
+    import msgpack
+    return msgpack
+
+
+def wants_msgpack(request):
+    """True when the client asks for MessagePack at least as strongly as JSON."""
+    if not MSGPACK_AVAILABLE:
+        return False
+    # same q-value syntax as Accept-Encoding
+    accepted = parse_accept_encoding(request.headers.get('Accept', ''))
+    msgpack_q = max(accepted.get(media_type, 0.0) for media_type in MSGPACK_TYPES)
+    return msgpack_q > 0 and msgpack_q >= accepted.get('application/json', 0.0)
+
+
+def _default(value):
+    # aware datetimes become the Timestamp extension type, everything else renders as in JSON
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return get_msgpack().Timestamp.from_datetime(value)
+    return _json_encoder.default(value)
+
+
+def packb(data):
+    return get_msgpack().packb(data, default=_default)
+
+
+def unpackb(body):
+    # Timestamps come back as aware UTC datetimes
+    return get_msgpack().unpackb(body, timestamp=3)
+
+
+class NegotiatingRenderer(JSONRenderer):
+    def render(self, request, data, *, response_status):
+        if wants_msgpack(request):
+            return packb(data)
+        return super().render(request, data, response_status=response_status)
+
+
+class NegotiatingParser(Parser):
+    def parse_body(self, request):
+        if request.content_type in MSGPACK_TYPES:
+            if not MSGPACK_AVAILABLE:
+                raise ValueError("MessagePack is not supported")
+            return unpackb(request.body)
+        return super().parse_body(request)
+
+
+class NegotiatingNinjaAPI(NinjaAPI):
+    """
+    NinjaAPI answering in MessagePack when the Accept header asks for it and
+    in JSON otherwise. Request bodies are parsed by their Content-Type.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('renderer', NegotiatingRenderer())
+        kwargs.setdefault('parser', NegotiatingParser())
+        super().__init__(**kwargs)
+
+    def create_response(self, request, data, *, status=None, temporal_response=None):
+        if temporal_response is None:
+            temporal_response = HttpResponse(status=status, content_type=self.get_request_content_type(request))
+        response = super().create_response(request, data, status=status, temporal_response=temporal_response)
+        if MSGPACK_AVAILABLE:
+            patch_vary_headers(response, ('Accept',))
+        return response
+
+    def create_temporal_response(self, request):
+        return HttpResponse("", content_type=self.get_request_content_type(request))
+
+    def get_request_content_type(self, request):
+        if wants_msgpack(request):
+            return MSGPACK_TYPE
+        return self.get_content_type()
@@ -0,0 +1,126 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .formats import MSGPACK_TYPE, wants_msgpack
+from .models import IdempotencyKey
+
+
+def fingerprint(request):
+    # the stored body is only replayable to a client asking for the same format
+    media_type = MSGPACK_TYPE if wants_msgpack(request) else "application/json"
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path} {media_type}\n".encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def claim(organization, key, request):
+    """
+    Reserve `key` for this request.
+
+    Returns (record, None) when the caller should run the view and then call
+    complete(), or (None, response) when the stored response (or an error)
+    must be returned instead. The unique (organization, key) constraint is what
+    serializes concurrent duplicates, so there is no read-before-insert. A
+    reservation is held for IDEMPOTENCY_LOCK_SECONDS; when its request died
+    without completing, the first retry after that takes it over.
+    """
+    request_fingerprint = fingerprint(request)
+
+    for _ in range(2):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.all_objects.create(
+                    organization=organization,
+                    key=key,
+                    method=request.method,
+                    path=request.path,
+                    fingerprint=request_fingerprint,
+                    locked_until=lock_until(now),
+                    expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                )
+            return record, None
+        except IntegrityError:
+            pass
+
+        existing = IdempotencyKey.all_objects.filter(organization=organization, key=key).first()
+        if existing is None:
+            continue
+        if existing.expires_at <= now:
+            IdempotencyKey.all_objects.filter(id=existing.id, expires_at__lte=now).delete()
+            continue
+        if existing.fingerprint != request_fingerprint:
+            return None, JsonResponse({"message": "Idempotency-Key was already used for a different request"}, status=422)
+        if existing.status_code is None:
+            return take_over(existing, now)
+        return None, replay(existing)
+
+    return None, conflict()
+
+
+def lock_until(now):
+    return now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+
+
+def take_over(record, now):
+    if record.locked_until is not None and record.locked_until > now:
+        return None, conflict()
+    # compare-and-swap on the old lease, only one of several retries wins
+    locked_until = lock_until(now)
+    taken = IdempotencyKey.all_objects.filter(
+        id=record.id, status_code__isnull=True, locked_until=record.locked_until
+    ).update(locked_until=locked_until)
+    if not taken:
+        return None, conflict()
+    record.locked_until = locked_until
+    return record, None
+
+
+def conflict():
+    response = JsonResponse({"message": "A request with this Idempotency-Key is still in progress"}, status=409)
+    response["Retry-After"] = "1"
+    return response
+
+
+def replay(record):
+    response = HttpResponse(bytes(record.body), status=record.status_code, content_type=record.content_type)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def complete(record, response):
+    # server errors and streamed bodies are not replayable, free the key for a retry
+    if response.status_code >= 500 or response.streaming:
+        IdempotencyKey.all_objects.filter(id=record.id).delete()
+        return
+
+    IdempotencyKey.all_objects.filter(id=record.id).update(
+        status_code=response.status_code,
+        content_type=response.get("Content-Type", ""),
+        body=response.content,
+    )
+
+
+def release(record):
+    IdempotencyKey.all_objects.filter(id=record.id).delete()
+
+
+def purge_expired(batch_size=1000, now=None):
+    now = now or timezone.now()
+    deleted = 0
+
+    while True:
+        ids = list(
+            IdempotencyKey.all_objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.all_objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,111 @@
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from pydantic import ValidationError
+
+from . import webhooks
+from .models import Task, User
+from .schemas import TaskInputSchema
+
+NDJSON_TYPES = {'application/x-ndjson', 'application/ndjson', 'application/jsonl'}
+CSV_TYPES = {'text/csv'}
+
+
+def ndjson_rows(stream):
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f"Invalid JSON: {e}")
+
+
+def csv_rows(stream):
+    reader = csv.DictReader(codecs.iterdecode(stream, 'utf-8-sig'))
+    try:
+        for row in reader:
+            # empty cells count as missing so schema defaults still apply
+            yield reader.line_num, {key: value for key, value in row.items() if key is not None and value != ''}
+    except UnicodeDecodeError:
+        yield reader.line_num + 1, ValueError("Invalid UTF-8, import stopped")
+    except csv.Error as e:
+        yield reader.line_num, ValueError(f"Invalid CSV: {e}")
+
+
+class TaskImporter:
+    """
+    Validates rows one at a time and inserts them in batches, so memory is
+    bounded by the batch size and the error report cap, not by the upload.
+    """
+
+    def __init__(self, organization, batch_size=None, max_errors=None):
+        self.organization = organization
+        self.batch_size = batch_size or settings.TASK_IMPORT_BATCH_SIZE
+        self.max_errors = settings.TASK_IMPORT_MAX_ERRORS if max_errors is None else max_errors
+        self.assignees = set(User.objects.values_list('id', flat=True))
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self._batch = []
+
+    def _error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "errors": errors})
+
+    def add(self, row, data):
+        if isinstance(data, Exception):
+            return self._error(row, [{"loc": [], "msg": str(data)}])
+        if not isinstance(data, dict):
+            return self._error(row, [{"loc": [], "msg": "Row must be an object"}])
+
+        try:
+            task = TaskInputSchema.model_validate(data)
+        except ValidationError as e:
+            return self._error(row, [
+                {"loc": list(error["loc"]), "msg": error["msg"]}
+                for error in e.errors(include_url=False, include_context=False, include_input=False)
+            ])
+
+        if task.assigned_to not in self.assignees:
+            return self._error(row, [{"loc": ["assigned_to"], "msg": "Cannot assign task to user from different organization"}])
+
+        self._batch.append(task)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+
+        with webhooks.publishing(self.organization.id, webhooks.TASK_CREATED) as events:
+            tasks = Task.objects.bulk_create([
+                Task(
+                    title=task.title,
+                    description=task.description,
+                    completed=task.completed,
+                    assigned_to_id=task.assigned_to,
+                    organization=self.organization,
+                    deadline_datetime_with_tz=task.deadline_datetime_with_tz,
+                    priority=task.priority,
+                )
+                for task in self._batch
+            ], batch_size=self.batch_size)
+            events.extend(webhooks.task_data(task) for task in tasks)
+
+        self.imported += len(self._batch)
+        self._batch = []
+
+    def run(self, rows):
+        for row, data in rows:
+            self.add(row, data)
+        self.flush()
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
@@ -0,0 +1,183 @@
+import logging
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .tenant import set_current_organization
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Defer(Exception):
+    """Raised by a handler that can't go on yet. The job runs again after `seconds` without using up an attempt."""
+
+    def __init__(self, seconds, reason=""):
+        super().__init__(reason)
+        self.seconds = seconds
+
+
+def job(name):
+    """Register a job handler. Handlers receive the Job and its payload as keyword arguments."""
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, organization=None, payload=None, max_attempts=3, run_after=None):
+    if name not in registry:
+        raise ValueError(f"Unknown job {name}")
+
+    return Job.all_objects.create(
+        name=name,
+        organization=organization,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_after=run_after or timezone.now(),
+    )
+
+
+def report_progress(job, progress, total=None):
+    # doubles as a heartbeat so long jobs keep their lease
+    fields = {"progress": progress, "locked_at": timezone.now()}
+    if total is not None:
+        fields["total"] = total
+    Job.all_objects.filter(id=job.id, locked_by=job.locked_by).update(**fields)
+    job.progress = progress
+    if total is not None:
+        job.total = total
+
+
+def _stale(now):
+    return Q(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOB_LEASE_SECONDS))
+
+
+def _claimable(now):
+    # a worker that died during the last attempt used it up
+    return Job.all_objects.filter(
+        Q(status=Job.QUEUED, run_after__lte=now) | _stale(now) & Q(attempts__lt=F('max_attempts'))
+    ).order_by('run_after', 'id')
+
+
+def fail_abandoned(now):
+    """Fail jobs whose lease ran out during their last attempt, nobody would claim them again."""
+    return Job.all_objects.filter(_stale(now), attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_by="", error="Lease expired during the last attempt", finished_at=now
+    )
+
+
+def claim(worker_id, now=None):
+    now = now or timezone.now()
+    fail_abandoned(now)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _claimable(now).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.RUNNING
+            job.locked_by = worker_id
+            job.locked_at = now
+            job.attempts += 1
+            job.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts'])
+            return job
+
+    # SQLite has no row locks, a conditional UPDATE acts as compare-and-swap instead
+    candidates = _claimable(now).values_list('id', 'status', 'locked_at')[:10]
+    for job_id, status, locked_at in candidates:
+        claimed = Job.all_objects.filter(id=job_id, status=status, locked_at=locked_at).update(
+            status=Job.RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.all_objects.get(id=job_id)
+    return None
+
+
+def _retry_delay(attempts):
+    delay = min(settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1), 3600)
+    return timedelta(seconds=delay * random.uniform(1.0, 1.1))
+
+
+def execute(job):
+    owned = Job.all_objects.filter(id=job.id, locked_by=job.locked_by)
+    handler = registry.get(job.name)
+
+    set_current_organization(job.organization)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job {job.name}")
+        result = handler(job, **job.payload)
+    except Defer as e:
+        owned.update(
+            status=Job.QUEUED,
+            run_after=timezone.now() + timedelta(seconds=e.seconds),
+            locked_by="",
+            locked_at=None,
+            attempts=F('attempts') - 1,
+            error=str(e),
+        )
+        return False
+    except Exception as e:
+        logger.exception("Job %s failed", job)
+        error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        if handler is not None and job.attempts < job.max_attempts:
+            owned.update(
+                status=Job.QUEUED,
+                run_after=timezone.now() + _retry_delay(job.attempts),
+                locked_by="",
+                locked_at=None,
+                error=error,
+            )
+        else:
+            owned.update(status=Job.FAILED, error=error, finished_at=timezone.now())
+        return False
+    else:
+        owned.update(status=Job.SUCCEEDED, result=result, error="", finished_at=timezone.now())
+        return True
+    finally:
+        set_current_organization(None)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def work(worker_id=None, burst=False, poll_interval=None, should_stop=lambda: False):
+    """Claim and run jobs until stopped. In burst mode return as soon as the queue is drained."""
+    worker_id = worker_id or default_worker_id()
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    processed = 0
+
+    while not should_stop():
+        job = claim(worker_id)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        execute(job)
+        processed += 1
+
+    return processed
+
+
+def run_worker_process(index, burst, poll_interval):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(f"{default_worker_id()}/{index}", burst=burst, poll_interval=poll_interval, should_stop=lambda: bool(stopping))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archive import archive_completed_tasks
+from api.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Move completed tasks past their organization's retention period to the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organization", type=int, help="Only archive this organization")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        organization = None
+        if options["organization"] is not None:
+            try:
+                organization = Organization.objects.get(id=options["organization"])
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization with id {options['organization']} does not exist")
+
+        def progress(org, count, archived):
+            self.stdout.write(f"{org.name}: {count} tasks archived")
+
+        archived = archive_completed_tasks(
+            organization=organization,
+            batch_size=options["batch_size"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} tasks"))
@@ -0,0 +1,32 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.api import api
+from api.openapi import render_schema, schema_path
+
+
+class Command(BaseCommand):
+    help = "Write the OpenAPI schema to STATIC_ROOT, where WhiteNoise serves it and the docs page loads it from"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="File to write, defaults to STATIC_ROOT/OPENAPI_SCHEMA_NAME")
+        parser.add_argument("--check", action="store_true", help="Fail if the file is missing or out of date instead of writing it")
+
+    def handle(self, *args, **options):
+        path = options["output"] or schema_path()
+        schema = render_schema(api)
+
+        if options["check"]:
+            if not os.path.exists(path):
+                raise CommandError(f"No OpenAPI schema at {path}")
+            with open(path) as f:
+                if f.read() != schema:
+                    raise CommandError(f"{path} is out of date, run generate_openapi")
+            self.stdout.write(f"{path} is up to date")
+            return
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            f.write(schema)
+        self.stdout.write(f"Wrote {path}")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Organization
+from api.rebalance import move_organization
+
+
+class Command(BaseCommand):
+    help = "Move an organization's users and tasks to another database while it stays online"
+
+    def add_arguments(self, parser):
+        parser.add_argument("organization_id", type=int)
+        parser.add_argument("database", help="Target database alias, one of SHARD_DATABASE_URLS or default")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        organization = Organization.objects.filter(id=options["organization_id"]).first()
+        if organization is None:
+            raise CommandError(f"Organization with id {options['organization_id']} does not exist")
+
+        try:
+            move_organization(
+                organization,
+                options["database"],
+                batch_size=options["batch_size"],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"Organization {organization.id} moved to {options['database']}"))
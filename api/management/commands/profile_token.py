@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed X-Profile header value that profiles the requests it is sent with"
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
+        self.stderr.write(f"Valid for {settings.PROFILING_TOKEN_MAX_AGE} seconds")
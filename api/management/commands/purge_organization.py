@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.jobs import Defer
+from api.models import Organization
+from api.purge import purge_organization
+
+
+class Command(BaseCommand):
+    help = "Delete an organization with all its users and tasks in bounded batches (resumable)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("organization_id", type=int)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        organization_id = options["organization_id"]
+        if not Organization.objects.filter(id=organization_id).exists():
+            raise CommandError(f"Organization with id {organization_id} does not exist")
+
+        totals = {}
+
+        def progress(label, count):
+            totals[label] = totals.get(label, 0) + count
+            self.stdout.write(f"{label}: {totals[label]} deleted")
+
+        while True:
+            try:
+                deleted = purge_organization(organization_id, batch_size=options["batch_size"], progress=progress)
+                break
+            except Defer as e:
+                self.stdout.write(f"{e}, checking again in {e.seconds}s")
+                time.sleep(e.seconds)
+        summary = ", ".join(f"{count} {label}" for label, count in deleted.items())
+        self.stdout.write(self.style.SUCCESS(f"Organization {organization_id} purged ({summary})"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.webhooks import purge_finished
+
+
+class Command(BaseCommand):
+    help = "Delete relayed outbox events and finished webhook deliveries past WEBHOOK_RETENTION_DAYS, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_finished(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} webhook events and deliveries"))
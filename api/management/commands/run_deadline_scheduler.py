@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from api.scheduler import DeadlineScheduler, FileSink
+
+
+class Command(BaseCommand):
+    help = "Emit due and overdue events for task deadlines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Append events as NDJSON to this file instead of stdout")
+        parser.add_argument("--sink", help="Dotted path to an EventSink class, overrides --output")
+        parser.add_argument("--horizon-minutes", type=int, default=60)
+        parser.add_argument("--catch-up-minutes", type=int, default=60)
+        parser.add_argument("--grace-seconds", type=int, default=60)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--interval", type=float, default=5.0, help="Maximum seconds between database syncs")
+        parser.add_argument("--reload-minutes", type=int, default=5,
+                            help="Minutes between full reloads, which pick up edits the syncs missed")
+        parser.add_argument("--once", action="store_true", help="Run a single tick and exit")
+        parser.add_argument("--database", default="default", help="Database to watch, run one scheduler per shard")
+
+    def handle(self, *args, **options):
+        if options["sink"]:
+            sink = import_string(options["sink"])()
+        elif options["output"]:
+            sink = FileSink(options["output"])
+        else:
+            sink = FileSink(stream=self.stdout)
+
+        scheduler = DeadlineScheduler(
+            sink,
+            horizon=timedelta(minutes=options["horizon_minutes"]),
+            catch_up=timedelta(minutes=options["catch_up_minutes"]),
+            grace=timedelta(seconds=options["grace_seconds"]),
+            batch_size=options["batch_size"],
+            reload_interval=timedelta(minutes=options["reload_minutes"]),
+            using=options["database"],
+        )
+
+        try:
+            if options["once"]:
+                emitted = scheduler.tick()
+                self.stderr.write(f"Emitted {emitted} events")
+            else:
+                scheduler.run_forever(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.close()
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.dispatcher import Dispatcher
+
+
+class Command(BaseCommand):
+    help = "Relay outbox events and deliver them to webhook subscriptions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.WEBHOOK_BATCH_SIZE, help="Events per request")
+        parser.add_argument("--concurrency", type=int, default=settings.WEBHOOK_MAX_CONCURRENCY, help="Requests in flight")
+        parser.add_argument("--poll-interval", type=float, default=settings.WEBHOOK_POLL_INTERVAL)
+        parser.add_argument("--once", action="store_true", help="Run a single round and exit")
+
+    def handle(self, *args, **options):
+        dispatcher = Dispatcher(batch_size=options["batch_size"], concurrency=options["concurrency"])
+
+        try:
+            if options["once"]:
+                sent = dispatcher.tick()
+                self.stdout.write(f"Attempted {sent} deliveries")
+            else:
+                dispatcher.run_forever(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,53 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = "Run background job workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=1, help="Number of worker processes")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is drained")
+        parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL)
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"])
+
+        if concurrency == 1:
+            processed = jobs.work(burst=options["burst"], poll_interval=options["poll_interval"])
+            self.stdout.write(f"Processed {processed} jobs")
+            return
+
+        # children must not inherit the parent's open database connections
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=jobs.run_worker_process,
+                args=(index, options["burst"], options["poll_interval"]),
+                daemon=False,
+            )
+            for index in range(concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {concurrency} workers")
+
+        def stop(*args):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            stop()
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,36 @@
+import os
+import sys
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Run the production server: gunicorn with core/gunicorn_conf.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker-class", choices=["sync", "gthread", "uvicorn"], help="Defaults to SERVER_WORKER_CLASS")
+        parser.add_argument("--workers", type=int, help="Defaults to WEB_CONCURRENCY")
+        parser.add_argument("--threads", type=int, help="Threads per gthread worker, defaults to SERVER_THREADS")
+        parser.add_argument("--bind", help="Defaults to SERVER_BIND")
+        parser.add_argument("--no-preload", action="store_true", help="Import the app in every worker instead of the master")
+
+    def handle(self, *args, **options):
+        # the config module reads settings in the gunicorn process, so overrides travel as environment variables
+        overrides = {
+            "SERVER_WORKER_CLASS": options["worker_class"],
+            "WEB_CONCURRENCY": options["workers"],
+            "SERVER_THREADS": options["threads"],
+            "SERVER_BIND": options["bind"],
+            "SERVER_PRELOAD": "False" if options["no_preload"] else None,
+        }
+        env = {**os.environ, **{key: str(value) for key, value in overrides.items() if value is not None}}
+
+        worker_class = env.get("SERVER_WORKER_CLASS", settings.SERVER_WORKER_CLASS)
+        if worker_class == "uvicorn" and not (find_spec("uvicorn_worker") or find_spec("uvicorn")):
+            raise CommandError("uvicorn workers need: pip install uvicorn-worker")
+
+        # exec, so gunicorn's master gets the signals sent to this process (SIGTERM drains gracefully)
+        argv = [sys.executable, "-m", "gunicorn", "-c", "python:core.gunicorn_conf"]
+        os.execvpe(argv[0], argv, env)
@@ -0,0 +1,37 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.slowlog import report
+
+
+class Command(BaseCommand):
+    help = "Rank logged slow queries by total time, grouped by normalized SQL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", help="Slow query log, defaults to SLOW_QUERY_LOG")
+        parser.add_argument("--limit", type=int, default=20)
+
+    def handle(self, *args, **options):
+        path = options["log"] or settings.SLOW_QUERY_LOG
+        if not os.path.exists(path):
+            raise CommandError(f"No slow query log at {path}")
+
+        with open(path) as f:
+            groups = report(f)
+
+        for rank, group in enumerate(groups[:options["limit"]], start=1):
+            self.stdout.write(
+                f"#{rank} {group['fingerprint']}  {group['count']}x  "
+                f"total {group['total_ms']:.1f} ms  max {group['max_ms']:.1f} ms"
+            )
+            self.stdout.write(f"    {group['sql']}")
+            if group["routes"]:
+                self.stdout.write(f"    routes: {', '.join(sorted(group['routes']))}")
+            if group["organizations"]:
+                self.stdout.write(f"    organizations: {len(group['organizations'])}")
+            if group["full_scans"]:
+                self.stdout.write(self.style.WARNING(f"    full scan on: {', '.join(group['full_scans'])}"))
+            for step in group["plan"] or []:
+                self.stdout.write(f"    | {step}")
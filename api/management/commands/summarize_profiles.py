@@ -0,0 +1,30 @@
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import select_profiles
+
+
+class Command(BaseCommand):
+    help = "Merge collected request profiles and print the hottest functions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", help="Profile directory, defaults to PROFILING_DIR")
+        parser.add_argument("--route", help="Only profiles whose route contains this, e.g. api_v1_tasks")
+        parser.add_argument("--organization", type=int, help="Only profiles of this organization id")
+        parser.add_argument("--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"])
+        parser.add_argument("--limit", type=int, default=30)
+
+    def handle(self, *args, **options):
+        paths = select_profiles(
+            options["dir"] or settings.PROFILING_DIR,
+            route=options["route"],
+            organization_id=options["organization"],
+        )
+        if not paths:
+            raise CommandError("No matching profiles")
+
+        stats = pstats.Stats(*paths, stream=self.stdout)
+        self.stdout.write(f"{len(paths)} profiles merged")
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
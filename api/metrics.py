@@ -0,0 +1,279 @@
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# name -> (type, help)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by route, method, status and organization tier"),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by route, method and organization tier"),
+    "db_queries_total": ("counter", "Database queries run while serving requests, by route"),
+    "jwt_failures_total": ("counter", "Rejected bearer tokens by reason"),
+    "cache_lookups_total": ("counter", "Cache lookups by cache and result (hit or miss)"),
+    "coalesced_requests_total": ("counter", "GET requests answered with another in-flight request's response, by path"),
+}
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# jwt_error messages of JWTAuthenticationMiddleware, anything else is "error"
+JWT_FAILURE_REASONS = {
+    "Token has expired": "expired",
+    "Invalid token": "invalid",
+    "User not found or inactive": "user_not_found",
+    "Token has been revoked": "revoked",
+}
+
+_HEADER = struct.Struct('i')
+_VALUE = struct.Struct('d')
+_INITIAL_SIZE = 64 * 1024
+
+
+class MmapStore:
+    """
+    Append-only key -> float64 file mapped into memory. Each process and
+    thread writes its own file, so recording a sample is a plain memory write
+    with no lock and no syscall; only a key seen for the first time can grow
+    the file. The layout is a used-bytes header followed by
+    [key length][key padded to 8 bytes][value] entries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.directory = os.path.dirname(path)
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _INITIAL_SIZE:
+            self._file.truncate(_INITIAL_SIZE)
+            size = _INITIAL_SIZE
+        self._capacity = size
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._positions = {}
+
+        self._used = _HEADER.unpack_from(self._mmap, 0)[0]
+        if self._used == 0:
+            self._used = 8
+            _HEADER.pack_into(self._mmap, 0, self._used)
+        for key, _, position in iter_entries(self._mmap, self._used):
+            self._positions[key] = position
+
+    def _add_key(self, key):
+        encoded = key.encode()
+        padding = (8 - (_HEADER.size + len(encoded)) % 8) % 8
+        entry = _HEADER.pack(len(encoded)) + encoded + b' ' * padding + _VALUE.pack(0.0)
+
+        if self._used + len(entry) > self._capacity:
+            while self._used + len(entry) > self._capacity:
+                self._capacity *= 2
+            self._file.truncate(self._capacity)
+            self._mmap.close()
+            self._mmap = mmap.mmap(self._file.fileno(), self._capacity)
+
+        self._mmap[self._used:self._used + len(entry)] = entry
+        position = self._used + len(entry) - _VALUE.size
+        self._used += len(entry)
+        # readers only look at entries below the header, so it is written last
+        _HEADER.pack_into(self._mmap, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def inc(self, key, amount=1.0):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._add_key(key)
+        _VALUE.pack_into(self._mmap, position, _VALUE.unpack_from(self._mmap, position)[0] + amount)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+def iter_entries(data, used):
+    position = 8
+    while position < used:
+        length = _HEADER.unpack_from(data, position)[0]
+        key_start = position + _HEADER.size
+        key = bytes(data[key_start:key_start + length]).decode()
+        padding = (8 - (_HEADER.size + length) % 8) % 8
+        value_position = key_start + length + padding
+        yield key, _VALUE.unpack_from(data, value_position)[0], value_position
+        position = value_position + _VALUE.size
+
+
+ARCHIVE_FILE = "archive.db"
+
+_local = threading.local()
+_pid = os.getpid()
+
+
+def _forget_parent_stores():
+    # a forked worker must not keep writing to its parent's files
+    global _local, _pid
+    _local = threading.local()
+    _pid = os.getpid()
+
+
+os.register_at_fork(after_in_child=_forget_parent_stores)
+
+
+def get_store():
+    store = getattr(_local, 'store', None)
+    directory = settings.METRICS_DIR
+    if store is None or store.directory != directory:
+        os.makedirs(directory, exist_ok=True)
+        store = MmapStore(os.path.join(directory, f"{_pid}-{threading.get_ident()}.db"))
+        _local.store = store
+    return store
+
+
+def mark_process_dead(pid, directory=None):
+    """
+    Fold the files of an exited process into ARCHIVE_FILE, so restarted
+    workers (SERVER_MAX_REQUESTS) don't leave a file per pid and thread
+    behind for every scrape to read. Only the gunicorn master calls this,
+    which makes it the archive's single writer.
+    """
+    directory = directory or settings.METRICS_DIR
+    paths = glob.glob(os.path.join(directory, f"{pid}-*.db"))
+    if not paths:
+        return
+    archive = MmapStore(os.path.join(directory, ARCHIVE_FILE))
+    try:
+        for key, value in _sum_files(paths).items():
+            archive.inc(key, value)
+    finally:
+        archive.close()
+    for path in paths:
+        os.remove(path)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in labels.items()) + "}"
+
+
+def inc(name, amount=1, **labels):
+    if settings.METRICS_ENABLED:
+        get_store().inc(_key(name, labels), amount)
+
+
+def observe(name, value, **labels):
+    if not settings.METRICS_ENABLED:
+        return
+    store = get_store()
+    for bound in DURATION_BUCKETS:
+        if value <= bound:
+            store.inc(_key(name + "_bucket", {**labels, "le": bound}))
+    store.inc(_key(name + "_bucket", {**labels, "le": "+Inf"}))
+    store.inc(_key(name + "_sum", labels), value)
+    store.inc(_key(name + "_count", labels))
+
+
+def record_cache_lookup(cache, hit):
+    inc("cache_lookups_total", cache=cache, result="hit" if hit else "miss")
+
+
+def _sum_files(paths):
+    totals = {}
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            # merged into the archive since it was listed
+            continue
+        if len(data) < 8:
+            continue
+        for key, value, _ in iter_entries(data, _HEADER.unpack_from(data, 0)[0]):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def collect(directory=None):
+    """Sum every process's file, and the archive of exited ones, into one {key: value} dict."""
+    return _sum_files(glob.glob(os.path.join(directory or settings.METRICS_DIR, "*.db")))
+
+
+def _metric_name(key):
+    name = key.split("{", 1)[0]
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def _format(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def render(totals=None):
+    """Prometheus text exposition format."""
+    totals = collect() if totals is None else totals
+    families = {}
+    # first-seen order keeps histogram buckets ascending
+    for key in totals:
+        families.setdefault(_metric_name(key), []).append(key)
+
+    lines = []
+    for name, keys in families.items():
+        kind, description = METRICS.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{key} {_format(totals[key])}" for key in keys)
+    return "\n".join(lines) + "\n"
+
+
+def clear(directory=None):
+    """Remove all samples, e.g. when the server starts."""
+    for path in glob.glob(os.path.join(directory or settings.METRICS_DIR, "*.db")):
+        os.remove(path)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        # the URL pattern, not the path, keeps the number of series bounded
+        route = match.route if match is not None else "unmatched"
+        organization = getattr(getattr(request, 'user', None), 'organization', None)
+        tier = organization.tier if organization is not None else "anonymous"
+
+        inc("http_requests_total", route=route, method=request.method, status=response.status_code, tier=tier)
+        observe("http_request_duration_seconds", duration, route=route, method=request.method, tier=tier)
+        if queries:
+            inc("db_queries_total", queries, route=route)
+
+        jwt_error = getattr(request, 'jwt_error', None)
+        if jwt_error:
+            inc("jwt_failures_total", reason=JWT_FAILURE_REASONS.get(jwt_error, "error"))
+
+        return response
@@ -1,13 +1,16 @@
-from .tenant import set_current_organization
+from .tenant import get_current_organization, set_current_organization
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
+from django.http import JsonResponse
 from .models import User
+from . import idempotency, ratelimit, revocation, sharding
 import jwt
 
 class JWTAuthenticationMiddleware(MiddlewareMixin):
     def process_request(self, request):
         request.user = None
         request.jwt_error = None
+        request.jwt_payload = None
         
         auth_header = request.headers.get('Authorization', '')
         if not auth_header.startswith('Bearer '):
@@ -23,12 +26,19 @@ class JWTAuthenticationMiddleware(MiddlewareMixin):
             )
             
             user_id = payload.get("user_id")
-            
+
+            # checked before the user lookup, a revoked token costs no more than a valid one
+            if revocation.is_revoked(payload):
+                request.jwt_error = "Token has been revoked"
+                return
+
             if user_id:
-                request.user = User.all_objects.select_related('organization').get(
-                    pk=user_id,
-                    is_active=True
-                )
+                user = sharding.get_user(user_id, is_active=True)
+                if revocation.issued_before_cutoff(payload, user):
+                    request.jwt_error = "Token has been revoked"
+                    return
+                request.user = user
+                request.jwt_payload = payload
 
         except jwt.ExpiredSignatureError:
             request.jwt_error = "Token has expired"
@@ -49,10 +59,55 @@ class OrganizationContextMiddleware:
         if hasattr(request.user, 'organization'):
             org = request.user.organization
 
+        if org is not None and org.purge_started_at is not None:
+            return JsonResponse({"message": "Organization is being deleted"}, status=403)
+
+        if org is not None and request.method not in ('GET', 'HEAD', 'OPTIONS') and sharding.is_frozen(org.id):
+            response = JsonResponse({"message": "Organization is being moved, try again shortly"}, status=503)
+            response["Retry-After"] = str(settings.SHARD_MAP_CACHE_SECONDS or 1)
+            return response
+
+        if org is not None:
+            retry_after = ratelimit.acquire(org)
+            if retry_after is not None:
+                return ratelimit.too_many_requests(retry_after)
+
         set_current_organization(org)
         
-        response = self.get_response(request)
-        
-        set_current_organization(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            set_current_organization(None)
+            if org is not None:
+                ratelimit.release(org)
         
-        return response
\ No newline at end of file
+        return response
+
+
+class IdempotencyMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = request.headers.get('Idempotency-Key')
+        org = get_current_organization()
+
+        if not key or org is None or request.method != 'POST' or request.path not in settings.IDEMPOTENT_PATHS:
+            return self.get_response(request)
+
+        if len(key) > 255:
+            return JsonResponse({"message": "Idempotency-Key is too long"}, status=400)
+
+        record, response = idempotency.claim(org, key, request)
+        if response is not None:
+            return response
+
+        try:
+            response = self.get_response(request)
+        except Exception:
+            idempotency.release(record)
+            raise
+
+        idempotency.complete(record, response)
+        return response
+
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-19 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_task_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='purge_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-19 12:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_user_directory(apps, schema_editor):
+    # before sharding every user lives in the default database
+    if schema_editor.connection.alias != 'default':
+        return
+    User = apps.get_model('api', 'User')
+    UserDirectory = apps.get_model('api', 'UserDirectory')
+    users = User.objects.using('default').values_list('id', 'username', 'organization_id').iterator()
+    UserDirectory.objects.using('default').bulk_create(
+        UserDirectory(user_id=user_id, username=username, organization_id=organization_id)
+        for user_id, username, organization_id in users
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_organization_purge_started_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardMap',
+            fields=[
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='api.organization')),
+                ('database', models.CharField(max_length=100)),
+                ('frozen', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserDirectory',
+            fields=[
+                ('user_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('username', models.CharField(db_index=True, max_length=150)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.organization')),
+            ],
+        ),
+        migrations.RunPython(fill_user_directory, migrations.RunPython.noop),
+    ]
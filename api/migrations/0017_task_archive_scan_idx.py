@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_cache_tables'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['organization', 'completed', 'updated_at'], name='task_archive_scan_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.sql import UpdateQuery
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from .tenant import get_current_organization
 
 
@@ -36,6 +39,13 @@ class CustomUserManager(BaseUserManager):
             
         return self.create_user(username, password, organization, **extra_fields)
 
+def can_update_returning(connection):
+    # MariaDB has RETURNING on INSERT and DELETE only, so the insert feature flags don't tell
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
 class TenantQuerySet(models.QuerySet):
     def for_current_organization(self):
         org = get_current_organization()
@@ -50,6 +60,31 @@ class TenantQuerySet(models.QuerySet):
         
         return self.filter(organization=org)
 
+    def update_returning(self, fields, **values):
+        """
+        update(**values) that returns `fields` of the updated rows as tuples.
+        PostgreSQL and SQLite hand them back from the UPDATE itself
+        (RETURNING), other databases lock the rows, update and re-read them
+        in one transaction.
+        """
+        connection = connections[self.db]
+        if can_update_returning(connection):
+            query = self.query.chain(UpdateQuery)
+            query.add_update_values(values)
+            sql, params = query.get_compiler(self.db).as_sql()
+            returning_sql, returning_params = connection.ops.return_insert_columns(
+                [self.model._meta.get_field(name) for name in fields]
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"{sql} {returning_sql}", (*params, *returning_params))
+                return cursor.fetchall()
+
+        rows = self.model._base_manager.using(self.db)
+        with transaction.atomic(using=self.db):
+            ids = list(self.select_for_update().values_list('pk', flat=True))
+            rows.filter(pk__in=ids).update(**values)
+            return list(rows.filter(pk__in=ids).values_list(*fields))
+
 
 class TenantManager(models.Manager):    
     def get_queryset(self):
@@ -67,7 +102,17 @@ class TenantUserManager(CustomUserManager):
 
 
 class Organization(models.Model):
+    STANDARD = "standard"
+    PREMIUM = "premium"
+    TIER_CHOICES = [
+        (STANDARD, "Standard"),
+        (PREMIUM, "Premium"),
+    ]
+
     name = models.CharField(max_length=100, unique=True)
+    tier = models.CharField(max_length=20, choices=TIER_CHOICES, default=STANDARD)
+    task_retention_days = models.PositiveIntegerField(null=True, blank=True)
+    purge_started_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -76,6 +121,8 @@ class Organization(models.Model):
 
 class User(AbstractUser):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    # tokens issued before this are rejected, see api.revocation
+    tokens_valid_after = models.DateTimeField(null=True, blank=True)
 
     objects = TenantUserManager()
     all_objects = models.Manager()
@@ -94,8 +141,11 @@ class Task(models.Model):
     assigned_to = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     deadline_datetime_with_tz = models.DateTimeField()
     priority = models.IntegerField()
+    # bumped by every write, compared by conditional updates (If-Match)
+    version = models.PositiveIntegerField(default=1)
 
     objects = TenantManager()
     all_objects = models.Manager()
@@ -106,6 +156,14 @@ class Task(models.Model):
                 fields=['organization', 'deadline_datetime_with_tz', 'priority'], 
                 name='task_tenant_order_idx'
             ),
+            # range scans of the deadline scheduler only ever look at open tasks
+            models.Index(
+                fields=['deadline_datetime_with_tz', 'id'],
+                name='task_open_deadline_idx',
+                condition=models.Q(completed=False),
+            ),
+            # archiving looks for an organization's completed tasks last touched before its cutoff
+            models.Index(fields=['organization', 'completed', 'updated_at'], name='task_archive_scan_idx'),
         ]
 
     def __str__(self):
@@ -119,5 +177,225 @@ class Task(models.Model):
         
         if self.assigned_to and self.assigned_to.organization_id != self.organization_id:
             raise ValueError("Cannot assign task to user from different organization")
-        
-        super().save(*args, **kwargs)
\ No newline at end of file
+
+        updating = not self._state.adding
+        if updating:
+            # bumped in the database, so saves of two stale copies still count twice
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+
+        super().save(*args, **kwargs)
+
+        if updating:
+            # deferred, so the bumped version is only loaded if the caller reads it
+            del self.version
+
+class ArchivedTask(models.Model):
+    # keeps the id the task had in the hot table
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    completed = models.BooleanField(default=True)
+    assigned_to = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deadline_datetime_with_tz = models.DateTimeField()
+    priority = models.IntegerField()
+    version = models.PositiveIntegerField(default=1)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TenantManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['organization', 'deadline_datetime_with_tz', 'priority'],
+                name='archived_task_tenant_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=100)
+    organization = models.ForeignKey(Organization, null=True, blank=True, on_delete=models.SET_NULL)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TenantManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    body = models.BinaryField(null=True, blank=True)
+    # a reservation whose request died is taken over by a retry once this passes
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = TenantManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'key'], name='idempotency_key_per_org'),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class ShardMap(models.Model):
+    # organizations without a row live in the default database
+    organization = models.OneToOneField(Organization, on_delete=models.CASCADE, primary_key=True)
+    database = models.CharField(max_length=100)
+    # writes are refused while the organization is being moved
+    frozen = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.organization_id} -> {self.database}"
+
+
+class UserDirectory(models.Model):
+    # global index kept in the default database, users themselves live on their organization's shard
+    user_id = models.BigIntegerField(primary_key=True)
+    username = models.CharField(max_length=150, db_index=True)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+
+    def __str__(self):
+        return f"{self.username} ({self.user_id})"
+
+
+class RevokedToken(models.Model):
+    # JWT ID of a logged out token; the row is only needed until the token expires anyway
+    jti = models.CharField(max_length=64, primary_key=True)
+    user_id = models.BigIntegerField()
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class WebhookSubscription(models.Model):
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    url = models.URLField(max_length=500)
+    # HMAC-SHA256 key for the X-Webhook-Signature header
+    secret = models.CharField(max_length=64)
+    # event types to send, all of them when empty
+    event_types = models.JSONField(default=list, blank=True)
+    # deliveries in flight to this endpoint at once
+    max_concurrency = models.PositiveSmallIntegerField(default=4)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TenantManager()
+    all_objects = models.Manager()
+
+    def __str__(self):
+        return self.url
+
+
+class OutboxEvent(models.Model):
+    # written in the transaction of the change it describes, on the organization's shard
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    event_type = models.CharField(max_length=100)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # set once the dispatcher has turned the event into WebhookDeliveries
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TenantManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(dispatched_at__isnull=True), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id}"
+
+
+class WebhookDelivery(models.Model):
+    PENDING = "pending"
+    DELIVERED = "delivered"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (DELIVERED, "Delivered"),
+        (FAILED, "Failed"),
+    ]
+
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    # copied from the OutboxEvent, which may live on another database
+    event_id = models.BigIntegerField()
+    event_type = models.CharField(max_length=100)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    event_created_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TenantManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['subscription', 'event_id'], name='webhook_delivery_per_event'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_delivery_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.event_id} -> {self.subscription_id} ({self.status})"
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import F
+
+from . import webhooks
+from .models import Task, User
+from .tenant import get_current_organization
+
+
+def reassign_tasks(user_id, new_assignee_id=None, batch_size=None):
+    """
+    Move every task of `user_id` to `new_assignee_id` (or unassign them) with
+    set-based UPDATEs of at most `batch_size` rows, so no row lock is held for
+    longer than one batch and nothing is loaded into model instances. Each
+    batch publishes a task.updated event per task it moved.
+    """
+    batch_size = batch_size or settings.OFFBOARD_BATCH_SIZE
+    organization_id = get_current_organization().id
+    updated = 0
+
+    while True:
+        ids = list(Task.objects.filter(assigned_to_id=user_id).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return updated
+
+        with webhooks.publishing(organization_id, webhooks.TASK_UPDATED) as events:
+            rows = Task.objects.filter(id__in=ids, assigned_to_id=user_id).update_returning(
+                ['id', 'version'],
+                assigned_to_id=new_assignee_id,
+                version=F('version') + 1,
+                updated_at=datetime.now(timezone.utc),
+            )
+            events.extend({"id": task_id, "assigned_to": new_assignee_id, "version": version} for task_id, version in rows)
+        updated += len(rows)
+
+
+def offboard_user(user_id, new_assignee_id=None, batch_size=None):
+    # deactivated users are rejected by JWTAuthenticationMiddleware on their next request,
+    # and their tokens stay revoked should the account be reactivated
+    User.objects.filter(id=user_id).update(is_active=False, tokens_valid_after=datetime.now(timezone.utc))
+    return reassign_tasks(user_id, new_assignee_id, batch_size)
@@ -0,0 +1,24 @@
+import json
+import os
+from urllib.parse import urljoin
+
+from django.conf import settings
+from ninja.openapi.docs import Swagger
+
+
+def schema_path():
+    return os.path.join(settings.STATIC_ROOT, settings.OPENAPI_SCHEMA_NAME)
+
+
+def render_schema(api):
+    # sorted keys keep the file stable, so --check can compare it byte for byte
+    return json.dumps(api.get_openapi_schema(), cls=api.renderer.encoder_class, indent=2, sort_keys=True) + "\n"
+
+
+class StaticSwagger(Swagger):
+    """Swagger UI that loads the schema written by generate_openapi, when there is one, instead of building it."""
+
+    def get_openapi_url(self, api, path_params):
+        if not path_params and os.path.exists(schema_path()):
+            return urljoin(settings.STATIC_URL, settings.OPENAPI_SCHEMA_NAME)
+        return super().get_openapi_url(api, path_params)
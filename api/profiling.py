@@ -0,0 +1,101 @@
+import cProfile
+import glob
+import os
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core import signing
+
+HEADER = 'X-Profile'
+SALT = 'api.profiling'
+
+
+def make_token():
+    """Value for the X-Profile header, valid for PROFILING_TOKEN_MAX_AGE seconds."""
+    return signing.TimestampSigner(salt=SALT).sign("profile")
+
+
+def has_valid_token(request):
+    token = request.headers.get(HEADER)
+    if not token:
+        return False
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def profile_name(route, organization_id):
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    return f"{time.time():.6f}-{slug}-org{organization_id or 0}-{os.getpid()}.prof"
+
+
+def parse_name(name):
+    """(route slug, organization id) from a profile file name."""
+    match = re.match(r'^[\d.]+-(.+)-org(\d+)-\d+\.prof$', os.path.basename(name))
+    if match is None:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+
+def rotate(directory, keep):
+    profiles = sorted(glob.glob(os.path.join(directory, '*.prof')), key=os.path.getmtime)
+    for path in profiles[:max(0, len(profiles) - keep)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ProfilingMiddleware:
+    """
+    Runs cProfile around a sampled fraction of requests (PROFILING_SAMPLE_RATE)
+    and around any request carrying a valid signed X-Profile header. Profiles
+    are written to PROFILING_DIR, newest PROFILING_MAX_FILES kept.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.PROFILING_SAMPLE_RATE
+        if not (has_valid_token(request) or (rate and random.random() < rate)):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active on this thread
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        match = getattr(request, 'resolver_match', None)
+        organization = getattr(getattr(request, 'user', None), 'organization', None)
+        name = profile_name(match.route if match is not None else "unmatched", getattr(organization, 'id', None))
+
+        directory = settings.PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, name))
+        rotate(directory, settings.PROFILING_MAX_FILES)
+
+        response['X-Profile-Id'] = name
+        return response
+
+
+def select_profiles(directory, route=None, organization_id=None):
+    selected = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.prof'))):
+        slug, org_id = parse_name(path)
+        if route is not None and (slug is None or route not in slug):
+            continue
+        if organization_id is not None and org_id != organization_id:
+            continue
+        selected.append(path)
+    return selected
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from . import sharding, webhooks
+from .deletion import delete_in_batches
+from .jobs import Defer, job, report_progress
+from .models import (
+    ArchivedTask, IdempotencyKey, Job, Organization, OutboxEvent, Task, User, WebhookDelivery, WebhookSubscription,
+)
+
+# children first, so every batch deletes rows nothing else points to any more
+PURGE_ORDER = [Task, ArchivedTask, OutboxEvent, WebhookDelivery, WebhookSubscription, IdempotencyKey, Job, User]
+
+
+def delete_tasks(organization_id, batch_size, progress=None):
+    """The organization's tasks in batches, each batch publishing a task.deleted event per task."""
+    tasks = Task.all_objects.using(sharding.shard_for(organization_id)).filter(organization_id=organization_id)
+    deleted = 0
+
+    while True:
+        with webhooks.publishing(organization_id, webhooks.TASK_DELETED) as events:
+            ids = list(tasks.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            count = tasks.filter(id__in=ids).delete()[1].get(Task._meta.label, 0)
+            events.extend({"id": task_id} for task_id in ids)
+        deleted += count
+        if progress and count:
+            progress(count)
+
+
+def purge_organization(organization_id, batch_size=1000, progress=None):
+    """
+    Delete an organization and all its rows. Safe to re-run after an
+    interruption: every step only deletes what is left. Raises Defer once
+    the tasks are gone while their task.deleted events are still being
+    delivered, run it again later.
+    """
+    Organization.objects.filter(id=organization_id, purge_started_at__isnull=True).update(
+        purge_started_at=timezone.now()
+    )
+
+    deleted = {}
+    for model in PURGE_ORDER:
+        label = model._meta.model_name
+        report = (lambda count, label=label: progress(label, count)) if progress else None
+        if model is Task:
+            deleted[label] = delete_tasks(organization_id, batch_size, report)
+            # the dispatcher needs the subscriptions deleted further down to deliver the task.deleted events
+            if webhooks.undelivered(organization_id):
+                raise Defer(settings.PURGE_WEBHOOK_WAIT_SECONDS, "waiting for webhook deliveries")
+            continue
+
+        rows = model.all_objects.using(sharding.using_for(model, organization_id)).filter(organization_id=organization_id)
+        deleted[label] = delete_in_batches(rows, batch_size, report)
+    webhooks.clear_cache(organization_id)
+
+    shard = sharding.shard_for(organization_id)
+    deleted["organization"] = Organization.objects.filter(id=organization_id).delete()[1].get('api.Organization', 0)
+    if shard != DEFAULT_DB_ALIAS:
+        Organization.objects.using(shard).filter(id=organization_id).delete()
+    return deleted
+
+
+def rows_to_purge(organization_id):
+    return sum(
+        model.all_objects.using(sharding.using_for(model, organization_id)).filter(organization_id=organization_id).count()
+        for model in PURGE_ORDER
+    )
+
+
+@job("organizations.purge")
+def purge_organization_job(job, organization_id, batch_size=1000):
+    # continues the count of a run that was deferred
+    done = job.progress
+    report_progress(job, done, total=done + rows_to_purge(organization_id))
+
+    def progress(label, count):
+        nonlocal done
+        done += count
+        report_progress(job, done)
+
+    return purge_organization(organization_id, batch_size=batch_size, progress=progress)
@@ -0,0 +1,107 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+
+def get_cache():
+    return caches[settings.RATE_LIMIT_CACHE]
+
+
+def limits_for(org):
+    return settings.RATE_LIMITS.get(org.tier) or settings.RATE_LIMITS['standard']
+
+
+def _incr(cache, key, delta, timeout):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # expired between calls, start over from zero
+        cache.add(key, 0, timeout)
+        return cache.incr(key, delta)
+
+
+def take_token(cache, org_id, rate, burst, now=None):
+    """
+    Token bucket in GCRA form: the bucket is a single "theoretical arrival
+    time" counter in microseconds, advanced with incr. That is only atomic
+    in local memory, Redis and Memcached, api.checks rejects other backends.
+
+    Returns None when the request may proceed, otherwise seconds to wait.
+    """
+    now = int((now if now is not None else time.time()) * 1_000_000)
+    interval = max(1, int(1_000_000 / rate))
+    capacity = burst * interval
+    timeout = math.ceil(capacity / 1_000_000) + 1
+    key = f"rl:tat:{org_id}"
+
+    cache.add(key, now, timeout)
+    tat = _incr(cache, key, interval, timeout)
+    if tat - interval < now:
+        # the bucket refilled while idle, restart the schedule at now
+        tat = now + interval
+        cache.set(key, tat, timeout)
+    else:
+        cache.touch(key, timeout)
+
+    if tat - now <= capacity:
+        return None
+
+    cache.decr(key, interval)
+    return (tat - capacity - now) / 1_000_000
+
+
+def enter(cache, org_id, limit):
+    key = f"rl:inflight:{org_id}"
+    timeout = settings.RATE_LIMIT_INFLIGHT_TTL
+    cache.add(key, 0, timeout)
+    if _incr(cache, key, 1, timeout) > limit:
+        cache.decr(key)
+        return False
+    cache.touch(key, timeout)
+    return True
+
+
+def leave(cache, org_id):
+    key = f"rl:inflight:{org_id}"
+    try:
+        if cache.decr(key) < 0:
+            cache.set(key, 0, settings.RATE_LIMIT_INFLIGHT_TTL)
+    except ValueError:
+        pass
+
+
+def acquire(org):
+    """Admit a request for `org`. Returns None on success or the Retry-After in seconds."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+
+    cache = get_cache()
+    limits = limits_for(org)
+    retry_after = take_token(cache, org.id, limits['rate'], limits['burst'])
+    if retry_after is not None:
+        return retry_after
+    if not enter(cache, org.id, limits['concurrency']):
+        return 1
+    return None
+
+
+def charge(org):
+    """Count one more request of `org` against its rate, for operations run inside an admitted request."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    limits = limits_for(org)
+    return take_token(get_cache(), org.id, limits['rate'], limits['burst'])
+
+
+def release(org):
+    if settings.RATE_LIMIT_ENABLED:
+        leave(get_cache(), org.id)
+
+
+def too_many_requests(retry_after):
+    response = JsonResponse({"message": "Too many requests for this organization"}, status=429)
+    response["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
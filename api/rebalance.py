@@ -0,0 +1,134 @@
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from . import sharding
+from .deletion import delete_in_batches
+from .models import ArchivedTask, Organization, OutboxEvent, ShardMap, Task, User
+
+# parents first when copying, children first when deleting
+COPY_ORDER = [User, Task, ArchivedTask, OutboxEvent]
+
+
+def upsert(model, objs, database):
+    """
+    Insert rows keeping their ids, or overwrite rows already copied earlier.
+    Plain SQL rather than bulk_create so auto_now fields keep their values.
+    """
+    if not objs:
+        return
+    connection = connections[database]
+    qn = connection.ops.quote_name
+    fields = model._meta.concrete_fields
+    columns = [qn(field.column) for field in fields]
+    pk = qn(model._meta.pk.column)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != pk)
+    sql = (
+        f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({pk}) DO UPDATE SET {updates}"
+    )
+    params = [[field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] for obj in objs]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def copy_rows(queryset, database, batch_size):
+    copied = 0
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            return copied
+        with transaction.atomic(using=database):
+            upsert(queryset.model, batch, database)
+        copied += len(batch)
+        last_id = batch[-1].id
+
+
+def remove_missing(model, organization_id, source, target, batch_size):
+    """Delete rows from `target` that were deleted from `source` since they were copied."""
+    removed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            model.all_objects.using(target).filter(organization_id=organization_id, id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        kept = set(model.all_objects.using(source).filter(id__in=ids).values_list('id', flat=True))
+        missing = [id for id in ids if id not in kept]
+        if missing:
+            removed += model.all_objects.using(target).filter(id__in=missing).delete()[1].get(model._meta.label, 0)
+        last_id = ids[-1]
+
+
+def _set_shard(organization, database, frozen):
+    ShardMap.objects.update_or_create(organization=organization, defaults={"database": database, "frozen": frozen})
+    sharding.clear_cache()
+
+
+def move_organization(organization, target, batch_size=1000, settle=None, log=lambda message: None):
+    """
+    Move an organization's users and tasks to the `target` database while it
+    stays online:
+
+    1. copy every row in id batches while the organization keeps working,
+    2. freeze it (writes get 503) and wait for every process to see that,
+    3. copy what changed during step 1 and drop what was deleted,
+    4. switch the shard map to `target`, then delete the old rows.
+
+    Group and permission assignments of users are not copied. Background jobs
+    of the organization should not run during the move.
+    """
+    source = sharding.shard_for(organization.id)
+    if target == source:
+        raise ValueError(f"Organization {organization.id} is already on {target}")
+    if target != DEFAULT_DB_ALIAS and target not in settings.DATABASE_SHARDS:
+        raise ValueError(f"{target} is not a shard database")
+
+    # processes cache the shard map, every state change needs that long to be seen everywhere
+    settle = settings.SHARD_MAP_CACHE_SECONDS if settle is None else settle
+    org_id = organization.id
+
+    sharding.replicate_organization(organization, target)
+    started = timezone.now()
+    # rows touched after `started` wait for step 3, so no task can point to a user that wasn't copied yet
+    online = [
+        User.all_objects.using(source).filter(organization_id=org_id),
+        Task.all_objects.using(source).filter(organization_id=org_id, updated_at__lt=started),
+        ArchivedTask.all_objects.using(source).filter(organization_id=org_id, archived_at__lt=started),
+    ]
+    for queryset in online:
+        count = copy_rows(queryset, target, batch_size)
+        log(f"{queryset.model._meta.model_name}: {count} copied")
+
+    _set_shard(organization, source, frozen=True)
+    log("frozen, waiting for writes to drain")
+    time.sleep(settle)
+
+    try:
+        copy_rows(User.all_objects.using(source).filter(organization_id=org_id), target, batch_size)
+        copy_rows(Task.all_objects.using(source).filter(organization_id=org_id, updated_at__gte=started), target, batch_size)
+        copy_rows(ArchivedTask.all_objects.using(source).filter(organization_id=org_id, archived_at__gte=started), target, batch_size)
+        # writes are frozen, so no new events; ones not relayed yet are relayed from the target
+        copy_rows(OutboxEvent.all_objects.using(source).filter(organization_id=org_id, dispatched_at__isnull=True), target, batch_size)
+        for model in reversed(COPY_ORDER):
+            count = remove_missing(model, org_id, source, target, batch_size)
+            log(f"{model._meta.model_name}: {count} removed")
+        sharding.reset_id_sequences(target)
+    except Exception:
+        _set_shard(organization, source, frozen=False)
+        raise
+
+    _set_shard(organization, target, frozen=False)
+    log(f"switched to {target}")
+    time.sleep(settle)
+
+    for model in reversed(COPY_ORDER):
+        delete_in_batches(model.all_objects.using(source).filter(organization_id=org_id), batch_size)
+    if source != DEFAULT_DB_ALIAS:
+        Organization.objects.using(source).filter(id=org_id).delete()
+    sharding.reset_id_sequences(source)
@@ -0,0 +1,179 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from . import metrics
+from .models import RevokedToken, User
+
+VERSION_KEY = "revocation:version"
+# revocations committed slightly out of order must still be picked up by the next delta sync
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class BloomFilter:
+    """
+    Set of strings in a fixed bit array. Never misses a member; reports a
+    non-member as present with probability `error_rate` while it holds at
+    most `capacity` items.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def get_cache():
+    return caches[settings.REVOCATION_CACHE]
+
+
+class Denylist:
+    """
+    Revoked JWT IDs as a per-process Bloom filter, so a token that was never
+    revoked costs no query. Only filter hits are confirmed in the database.
+
+    At most every REVOCATION_SYNC_SECONDS a process adds the IDs revoked
+    since its last sync to its filter. When REVOCATION_CACHE is shared, every
+    revocation bumps a version counter in it and the table is only queried
+    when the counter changed; a per-process cache can't tell, so the table is
+    queried every time.
+    The filter is rebuilt from the unexpired rows every
+    REVOCATION_REBUILD_SECONDS, which drops expired tokens from it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._version = None
+        self._synced_until = None
+
+    def _load(self, filter, queryset):
+        for jti in queryset.values_list('jti', flat=True).iterator():
+            filter.add(jti)
+
+    def refresh(self):
+        now = time.monotonic()
+        if self._filter is not None and now - self._checked_at < settings.REVOCATION_SYNC_SECONDS:
+            return
+
+        with self._lock:
+            if self._filter is not None and now - self._checked_at < settings.REVOCATION_SYNC_SECONDS:
+                return
+            self._checked_at = now
+            cache = get_cache()
+            shared = not isinstance(cache, LocMemCache)
+            version = None
+            if shared:
+                # read before querying, a revocation racing the query is then picked up next time
+                version = cache.get(VERSION_KEY)
+                metrics.record_cache_lookup(settings.REVOCATION_CACHE, hit=version is not None)
+            started = timezone.now()
+
+            if self._filter is None or now - self._built_at >= settings.REVOCATION_REBUILD_SECONDS:
+                filter = BloomFilter(settings.REVOCATION_FILTER_CAPACITY, settings.REVOCATION_FILTER_ERROR_RATE)
+                self._load(filter, RevokedToken.objects.filter(expires_at__gt=started))
+                self._filter = filter
+                self._built_at = now
+            elif not shared or version != self._version:
+                self._load(self._filter, RevokedToken.objects.filter(revoked_at__gte=self._synced_until))
+            else:
+                return
+
+            self._version = version
+            self._synced_until = started - SYNC_OVERLAP
+
+    def add(self, jti):
+        self.refresh()
+        with self._lock:
+            self._filter.add(jti)
+
+    def __contains__(self, jti):
+        self.refresh()
+        if jti not in self._filter:
+            return False
+        # a filter hit may be a false positive
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def clear(self):
+        with self._lock:
+            self._filter = None
+
+
+denylist = Denylist()
+
+
+def _bump_version(cache):
+    cache.add(VERSION_KEY, 0, None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # evicted between the two calls, any new value makes other processes sync
+        cache.set(VERSION_KEY, 1, None)
+
+
+def revoke_token(payload):
+    """Deny one token (by its `jti`) until it expires."""
+    RevokedToken.objects.bulk_create([
+        RevokedToken(
+            jti=payload["jti"],
+            user_id=payload["user_id"],
+            expires_at=datetime.fromtimestamp(payload["exp"], tz=dt_timezone.utc),
+        )
+    ], ignore_conflicts=True)
+    denylist.add(payload["jti"])
+    _bump_version(get_cache())
+
+
+def revoke_user_tokens(user_id):
+    """Deny every token issued to the user so far. Checked against the user row loaded for each request anyway."""
+    return User.objects.filter(id=user_id).update(tokens_valid_after=timezone.now())
+
+
+def is_revoked(payload):
+    jti = payload.get("jti")
+    return jti is not None and jti in denylist
+
+
+def issued_before_cutoff(payload, user):
+    if user.tokens_valid_after is None:
+        return False
+    # tokens from before iat was added count as issued at the epoch
+    return payload.get("iat", 0) < user.tokens_valid_after.timestamp()
+
+
+def purge_expired(batch_size=1000, now=None):
+    now = now or timezone.now()
+    deleted = 0
+
+    while True:
+        ids = list(
+            RevokedToken.objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('jti', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += RevokedToken.objects.filter(jti__in=ids).delete()[0]
@@ -0,0 +1,56 @@
+# columns of TaskSchema, read straight from the joined tables
+TASK_ROW_FIELDS = (
+    'id', 'title', 'description', 'completed', 'created_at', 'deadline_datetime_with_tz', 'priority', 'version',
+    'assigned_to_id', 'assigned_to__username', 'assigned_to__organization_id', 'assigned_to__organization__name',
+    'organization_id', 'organization__name',
+)
+
+
+def task_rows(queryset):
+    """Tasks as namedtuple rows of TASK_ROW_FIELDS, no model instances involved."""
+    return queryset.values_list(*TASK_ROW_FIELDS, named=True)
+
+
+def serialize_tasks(rows):
+    """
+    TaskSchema dicts for task rows, built without pydantic, keys in the
+    schema's order so the rendered bytes don't change. Assignees and
+    organizations repeat across a page, so each one's dict is built once and
+    shared by all its tasks.
+    """
+    organizations = {}
+    users = {}
+
+    def organization(organization_id, name):
+        data = organizations.get(organization_id)
+        if data is None:
+            data = organizations[organization_id] = {"id": organization_id, "name": name}
+        return data
+
+    def user(row):
+        if row.assigned_to_id is None:
+            return None
+        data = users.get(row.assigned_to_id)
+        if data is None:
+            data = users[row.assigned_to_id] = {
+                "organization": organization(row.assigned_to__organization_id, row.assigned_to__organization__name),
+                "id": row.assigned_to_id,
+                "username": row.assigned_to__username,
+            }
+        return data
+
+    return [
+        {
+            "assigned_to": user(row),
+            "organization": organization(row.organization_id, row.organization__name),
+            "id": row.id,
+            "title": row.title,
+            "description": row.description,
+            "completed": row.completed,
+            "created_at": row.created_at,
+            "deadline_datetime_with_tz": row.deadline_datetime_with_tz,
+            "priority": row.priority,
+            "version": row.version,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,243 @@
+import heapq
+import json
+import queue
+import time
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Task
+
+DUE = "task.due"
+OVERDUE = "task.overdue"
+
+
+class EventSink:
+    def emit(self, events):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileSink(EventSink):
+    """Appends events as NDJSON lines, one flush per batch."""
+
+    def __init__(self, path=None, stream=None):
+        self._owned = stream is None
+        self.stream = stream if stream is not None else open(path, "a", encoding="utf-8")
+
+    def emit(self, events):
+        self.stream.write("".join(json.dumps(event) + "\n" for event in events))
+        self.stream.flush()
+
+    def close(self):
+        if self._owned:
+            self.stream.close()
+
+
+class QueueSink(EventSink):
+    """Hands every batch to a local queue.Queue consumer."""
+
+    def __init__(self, target=None):
+        self.queue = target if target is not None else queue.Queue()
+
+    def emit(self, events):
+        self.queue.put(list(events))
+
+
+class DeadlineScheduler:
+    """
+    Keeps the deadlines of open tasks for the next `horizon` in a timer heap.
+
+    Deadlines are loaded in keyset pages over task_open_deadline_idx, so each
+    refill only reads the slice of the index that entered the window. Task
+    edits are picked up through Task.updated_at and every heap entry is
+    re-checked against the database right before it fires, which covers
+    deleted and completed tasks as well.
+
+    updated_at is set before a transaction commits, so a write committing
+    later than `sync_overlap` after its timestamp is invisible to the syncs.
+    Every `reload_interval` the whole window is loaded again, which bounds
+    how long such a task can be missed.
+    """
+
+    def __init__(self, sink, horizon=timedelta(hours=1), catch_up=timedelta(hours=1),
+                 grace=timedelta(minutes=1), batch_size=500, sync_overlap=timedelta(seconds=5),
+                 reload_interval=timedelta(minutes=5), now=None, using=None):
+        now = now or timezone.now()
+        self.sink = sink
+        # one scheduler per database when tenants are sharded
+        self.using = using
+        self.horizon = horizon
+        self.catch_up = catch_up
+        self.grace = grace
+        self.batch_size = batch_size
+        self.sync_overlap = sync_overlap
+        self.reload_interval = reload_interval
+
+        self._heap = []
+        self._scheduled = {}
+        self._fired = {}
+        self._cursor = (now - catch_up, 0)
+        self._loaded_until = now - catch_up
+        self._synced_at = now
+        self._reloaded_at = now
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def _open_tasks(self):
+        return Task.all_objects.using(self.using).filter(completed=False)
+
+    def _after_cursor(self):
+        deadline, task_id = self._cursor
+        after = Q(deadline_datetime_with_tz__gt=deadline)
+        if task_id is not None:
+            after |= Q(deadline_datetime_with_tz=deadline, id__gt=task_id)
+        return after
+
+    def _schedule(self, task_id, deadline):
+        if self._scheduled.get(task_id) == deadline or self._fired.get(task_id) == deadline:
+            return False
+        self._scheduled[task_id] = deadline
+        heapq.heappush(self._heap, (deadline, task_id))
+        return True
+
+    def load(self, now=None):
+        now = now or timezone.now()
+        until = now + self.horizon
+        loaded = 0
+
+        while True:
+            page = list(
+                self._open_tasks()
+                .filter(self._after_cursor(), deadline_datetime_with_tz__lte=until)
+                .order_by('deadline_datetime_with_tz', 'id')
+                .values_list('id', 'deadline_datetime_with_tz')[:self.batch_size]
+            )
+            for task_id, deadline in page:
+                self._schedule(task_id, deadline)
+            loaded += len(page)
+
+            if len(page) < self.batch_size:
+                break
+            self._cursor = (page[-1][1], page[-1][0])
+
+        self._cursor = (until, None)
+        self._loaded_until = until
+        return loaded
+
+    def reload(self, now=None):
+        """Load the whole window again, from `catch_up` ago up to `horizon` ahead."""
+        now = now or timezone.now()
+        self._cursor = (now - self.catch_up, 0)
+        self._reloaded_at = now
+        return self.load(now)
+
+    def sync(self, now=None):
+        now = now or timezone.now()
+        since = self._synced_at - self.sync_overlap
+        oldest = now - self.catch_up
+        changed = 0
+        last = None
+
+        while True:
+            page = Task.all_objects.using(self.using).filter(updated_at__gte=since)
+            if last is not None:
+                page = page.filter(Q(updated_at__gt=last[0]) | Q(updated_at=last[0], id__gt=last[1]))
+            page = list(
+                page.order_by('updated_at', 'id')
+                .values_list('id', 'updated_at', 'deadline_datetime_with_tz', 'completed')[:self.batch_size]
+            )
+            for task_id, updated_at, deadline, completed in page:
+                if completed or deadline > self._loaded_until or deadline < oldest:
+                    if self._scheduled.pop(task_id, None) is not None:
+                        changed += 1
+                elif self._schedule(task_id, deadline):
+                    changed += 1
+
+            if len(page) < self.batch_size:
+                break
+            last = (page[-1][1], page[-1][0])
+
+        self._synced_at = now
+        return changed
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            deadline, task_id = heapq.heappop(self._heap)
+            # stale entries are left behind in the heap when a task is rescheduled
+            if self._scheduled.get(task_id) != deadline:
+                continue
+            del self._scheduled[task_id]
+            due.append((task_id, deadline))
+        return due
+
+    def fire(self, now=None):
+        now = now or timezone.now()
+        emitted = 0
+
+        while True:
+            due = self._pop_due(now)
+            if not due:
+                break
+
+            current = {
+                task_id: (deadline, org_id, assignee_id)
+                for task_id, deadline, org_id, assignee_id in self._open_tasks()
+                .filter(id__in=[task_id for task_id, _ in due])
+                .values_list('id', 'deadline_datetime_with_tz', 'organization_id', 'assigned_to_id')
+            }
+
+            events = []
+            for task_id, deadline in due:
+                row = current.get(task_id)
+                if row is None:
+                    continue
+                if row[0] != deadline:
+                    # the deadline moved since the last sync, requeue it if it is still inside the window
+                    if row[0] <= self._loaded_until:
+                        self._schedule(task_id, row[0])
+                    continue
+
+                self._fired[task_id] = deadline
+                events.append({
+                    "event": DUE if now - deadline <= self.grace else OVERDUE,
+                    "task_id": task_id,
+                    "organization_id": row[1],
+                    "assigned_to_id": row[2],
+                    "deadline": deadline.isoformat(),
+                    "emitted_at": now.isoformat(),
+                })
+
+            if events:
+                self.sink.emit(events)
+                emitted += len(events)
+
+        oldest = now - self.catch_up
+        self._fired = {task_id: deadline for task_id, deadline in self._fired.items() if deadline >= oldest}
+        return emitted
+
+    def tick(self, now=None):
+        now = now or timezone.now()
+        self.sync(now)
+        if now - self._reloaded_at >= self.reload_interval:
+            self.reload(now)
+        elif self._loaded_until < now + self.horizon / 2:
+            self.load(now)
+        return self.fire(now)
+
+    def next_wakeup(self, now, interval):
+        while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return interval
+        return max(0.0, min(interval, (self._heap[0][0] - now).total_seconds()))
+
+    def run_forever(self, interval=5.0):
+        while True:
+            self.tick()
+            time.sleep(self.next_wakeup(timezone.now(), interval))
@@ -1,7 +1,8 @@
 from pydantic import BaseModel
 from ninja import ModelSchema, Schema
-from datetime import datetime
-from .models import User, Task, Organization
+from datetime import date, datetime
+from typing import Any, Literal, Optional
+from .models import User, Task, Organization, Job, WebhookSubscription
 
 class OrganizationSchema(ModelSchema):
     class Meta:
@@ -25,7 +26,11 @@ class TaskSchema(ModelSchema):
     
     class Meta:
         model = Task
-        fields = ['id', 'title', 'description', 'completed', 'assigned_to', 'organization', 'created_at', 'deadline_datetime_with_tz', 'priority']
+        fields = ['id', 'title', 'description', 'completed', 'assigned_to', 'organization', 'created_at', 'deadline_datetime_with_tz', 'priority', 'version']
+
+class PagedTaskSchema(Schema):
+    items: list[TaskSchema]
+    count: int
 
 class TaskInputSchema(Schema):
     title: str
@@ -34,6 +39,18 @@ class TaskInputSchema(Schema):
     assigned_to: int
     deadline_datetime_with_tz: datetime
     priority: int
+    # expected current version for PUT, the If-Match header takes precedence
+    version: Optional[int] = None
+
+class TaskPatchSchema(Schema):
+    # only fields sent by the client are written, assigned_to may be null to unassign
+    title: str = None
+    description: str = None
+    completed: bool = None
+    assigned_to: Optional[int] = None
+    deadline_datetime_with_tz: datetime = None
+    priority: int = None
+    version: int = None
 
 class TokenSchema(Schema):
     token: str
@@ -46,4 +63,73 @@ class UserCreatedSchema(Schema):
     user_id: int 
     
 class TaskCreatedSchema(Schema):
-    task_id: int 
\ No newline at end of file
+    task_id: int
+    version: Optional[int] = None
+
+class TaskCalendarSchema(Schema):
+    bucket: Literal['day', 'week']
+    tz: str
+    # one entry per non-empty bucket, starts[i] is the bucket's first day
+    starts: list[date]
+    counts: list[int]
+    task_ids: list[list[int]]
+
+class TaskImportErrorSchema(Schema):
+    row: int
+    errors: list[dict]
+
+class TaskImportResultSchema(Schema):
+    imported: int
+    failed: int
+    errors: list[TaskImportErrorSchema]
+    errors_truncated: bool
+
+class BatchOperationSchema(Schema):
+    method: Literal['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
+    # relative to the API root, e.g. "tasks/3" or "tasks?limit=10"
+    path: str
+    body: Any = None
+    # e.g. If-Match, the batch's Authorization always applies
+    headers: dict[str, str] = {}
+
+class BatchSchema(Schema):
+    operations: list[BatchOperationSchema]
+    # stop at the first failed operation and roll back all of them
+    atomic: bool = False
+
+class BatchResultSchema(Schema):
+    status: int
+    headers: dict[str, str]
+    body: Any = None
+
+class OffboardSchema(Schema):
+    # active user of the same organization, tasks are unassigned when omitted
+    reassign_to: Optional[int] = None
+
+class OffboardResultSchema(Schema):
+    user_id: int
+    reassigned_tasks: int
+
+class JobSchema(ModelSchema):
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'status', 'attempts', 'max_attempts', 'progress', 'total', 'result', 'error', 'created_at', 'finished_at']
+
+class JobAcceptedSchema(Schema):
+    job_id: int
+
+class WebhookSubscriptionSchema(ModelSchema):
+    class Meta:
+        model = WebhookSubscription
+        fields = ['id', 'url', 'event_types', 'max_concurrency', 'is_active', 'created_at']
+
+class WebhookSubscriptionInputSchema(Schema):
+    url: str
+    # all event types when empty
+    event_types: list[str] = []
+    max_concurrency: int = 4
+
+class WebhookSubscriptionCreatedSchema(Schema):
+    id: int
+    # for verifying X-Webhook-Signature, only returned here
+    secret: str
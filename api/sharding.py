@@ -0,0 +1,200 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max
+
+from . import metrics
+from .models import ArchivedTask, Organization, OutboxEvent, ShardMap, Task, User, UserDirectory
+from .tenant import get_current_organization
+
+# rows of these models live on their organization's shard, everything else in default
+SHARDED_MODELS = (User, Task, ArchivedTask, OutboxEvent)
+
+_shard_map = {}
+
+
+def enabled():
+    return bool(settings.DATABASE_SHARDS)
+
+
+def clear_cache():
+    _shard_map.clear()
+
+
+def shard_state(organization_id):
+    """(database alias, frozen) for an organization, cached for SHARD_MAP_CACHE_SECONDS."""
+    if not enabled():
+        return DEFAULT_DB_ALIAS, False
+
+    cached = _shard_map.get(organization_id)
+    hit = cached is not None and cached[2] > time.monotonic()
+    metrics.record_cache_lookup("shard_map", hit=hit)
+    if hit:
+        return cached[0], cached[1]
+
+    row = ShardMap.objects.filter(organization_id=organization_id).values_list('database', 'frozen').first()
+    database, frozen = row or (DEFAULT_DB_ALIAS, False)
+    _shard_map[organization_id] = (database, frozen, time.monotonic() + settings.SHARD_MAP_CACHE_SECONDS)
+    return database, frozen
+
+
+def shard_for(organization_id):
+    return shard_state(organization_id)[0]
+
+
+def is_frozen(organization_id):
+    return shard_state(organization_id)[1]
+
+
+def using_for(model, organization_id):
+    return shard_for(organization_id) if model in SHARDED_MODELS else DEFAULT_DB_ALIAS
+
+
+def shard_index(database):
+    if database == DEFAULT_DB_ALIAS:
+        return 0
+    return settings.DATABASE_SHARDS.index(database) + 1
+
+
+class ShardRouter:
+    """
+    Sends Task/ArchivedTask/User queries to the current organization's shard
+    and everything else to the default database. Every database gets the full
+    schema, so the organization row a shard's foreign keys point to can be
+    replicated there.
+    """
+
+    def _db(self, model, **hints):
+        if model not in SHARDED_MODELS:
+            return DEFAULT_DB_ALIAS
+
+        # organizations live in default, so only a sharded instance says where its relatives are
+        instance = hints.get('instance')
+        if isinstance(instance, SHARDED_MODELS) and instance._state.db:
+            return instance._state.db
+
+        org = get_current_organization()
+        return shard_for(org.id) if org is not None else None
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ShardedModelBackend(ModelBackend):
+    """Finds the user through UserDirectory before checking the password on the user's shard."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if not enabled():
+            return super().authenticate(request, username=username, password=password, **kwargs)
+        if username is None or password is None:
+            return None
+
+        directory = UserDirectory.objects.filter(username=username).values_list('user_id', 'organization_id')
+        for user_id, organization_id in directory:
+            user = User.all_objects.using(shard_for(organization_id)).filter(id=user_id).first()
+            if user is not None and user.check_password(password) and self.user_can_authenticate(user):
+                return user
+        return None
+
+    def get_user(self, user_id):
+        try:
+            user = get_user(user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+def get_user(user_id, **filters):
+    """Load a user with its organization from whichever database holds it."""
+    if not enabled():
+        return User.all_objects.select_related('organization').get(pk=user_id, **filters)
+
+    organization_id = UserDirectory.objects.filter(user_id=user_id).values_list('organization_id', flat=True).first()
+    if organization_id is None:
+        raise User.DoesNotExist
+    user = User.all_objects.using(shard_for(organization_id)).get(pk=user_id, **filters)
+    # the authoritative row is in default, the shard only keeps a copy for its foreign keys
+    user.organization = Organization.objects.get(pk=organization_id)
+    return user
+
+
+def update_directory(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or not (created or update_fields is None or 'username' in update_fields):
+        return
+    if created:
+        # a new id can't have an entry yet, skip update_or_create's SELECT and savepoint
+        UserDirectory.objects.create(user_id=instance.id, username=instance.username, organization_id=instance.organization_id)
+        return
+    UserDirectory.objects.update_or_create(
+        user_id=instance.id,
+        defaults={"username": instance.username, "organization_id": instance.organization_id},
+    )
+
+
+def replicate_organization(organization, database):
+    if database == DEFAULT_DB_ALIAS:
+        return
+    Organization.objects.using(database).filter(id=organization.id).delete()
+    Organization.objects.using(database).bulk_create([
+        Organization(**{field.attname: getattr(organization, field.attname) for field in Organization._meta.concrete_fields})
+    ])
+
+
+def _get_sequence(connection, table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_sequence_last_value(pg_get_serial_sequence(%s, 'id')::regclass)", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return (row and row[0]) or 0
+
+
+def _set_sequence(connection, table, last):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [last, table])
+            if not cursor.rowcount:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, last])
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)", [table, max(last, 1), last > 0])
+
+
+def reset_id_sequences(database):
+    """
+    Keep the User, Task and OutboxEvent id sequences of `database` inside its
+    own block of SHARD_ID_BLOCK ids, so ids stay globally unique and rows can
+    move between shards unchanged. Needed again after rows from another block were copied
+    in, since SQLite advances the sequence past explicit ids.
+    """
+    start = shard_index(database) * settings.SHARD_ID_BLOCK
+    end = start + settings.SHARD_ID_BLOCK
+    connection = connections[database]
+
+    # archived tasks keep their ids, so they count as used too
+    tables = (
+        (User._meta.db_table, [User]),
+        (Task._meta.db_table, [Task, ArchivedTask]),
+        (OutboxEvent._meta.db_table, [OutboxEvent]),
+    )
+    for table, models in tables:
+        last = max(
+            model.all_objects.using(database).filter(id__gte=start, id__lt=end).aggregate(last=Max('id'))['last'] or start
+            for model in models
+        )
+        current = _get_sequence(connection, table)
+        if current is not None and not (last <= current < end):
+            _set_sequence(connection, table, last)
+
+
+def reserve_id_range(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    # post_migrate hook
+    if enabled() and (using == DEFAULT_DB_ALIAS or using in settings.DATABASE_SHARDS):
+        reset_id_sequences(using)
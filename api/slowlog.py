@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connections
+
+from .tenant import get_current_organization
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIX = {
+    'sqlite': "EXPLAIN QUERY PLAN ",
+    'postgresql': "EXPLAIN ",
+    'mysql': "EXPLAIN ",
+}
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+_context = threading.local()
+_queue = queue.Queue(maxsize=1000)
+_worker = None
+_worker_lock = threading.Lock()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"IN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(sql):
+    """SQL with literals and placeholders as ?, IN lists folded, so similar queries group together."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def params_shape(params, many):
+    if many:
+        return ["executemany"]
+    if not params:
+        return []
+    values = params.values() if isinstance(params, dict) else params
+    return [type(value).__name__ for value in values]
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    if getattr(_context, 'explaining', False):
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+            record(context['connection'], sql, params, many, duration_ms)
+
+
+def record(connection, sql, params, many, duration_ms):
+    normalized = normalize(sql)
+    organization = get_current_organization()
+    entry = {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "fingerprint": fingerprint(normalized),
+        "sql": normalized,
+        "params": params_shape(params, many),
+        "duration_ms": round(duration_ms, 3),
+        "route": getattr(_context, 'route', None),
+        "organization_id": organization.id if organization is not None else None,
+        "database": connection.alias,
+    }
+    explain = None
+    if not many and connection.vendor in EXPLAIN_PREFIX and sql.lstrip().upper().startswith(EXPLAINABLE):
+        explain = (connection.alias, sql, params)
+
+    ensure_worker()
+    try:
+        _queue.put_nowait((entry, explain))
+    except queue.Full:
+        logger.warning("Slow query log queue is full, dropping %s", entry["fingerprint"])
+
+
+def _explain(alias, sql, params):
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        cursor.execute(EXPLAIN_PREFIX[connection.vendor] + sql, params)
+        return [" ".join(str(column) for column in row) for row in cursor.fetchall()]
+
+
+def _write(entry):
+    with open(settings.SLOW_QUERY_LOG, 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def _run_worker():
+    # EXPLAIN runs here, on this thread's own connections, never on the request path
+    _context.explaining = True
+    while True:
+        entry, explain = _queue.get()
+        try:
+            if explain is not None:
+                try:
+                    entry["plan"] = _explain(*explain)
+                except Exception as e:
+                    entry["explain_error"] = str(e)
+            _write(entry)
+        except Exception:
+            logger.exception("Could not write slow query log entry")
+        finally:
+            _queue.task_done()
+
+
+def ensure_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="slow-query-explain", daemon=True)
+            _worker.start()
+
+
+def flush():
+    """Block until every queued entry is written."""
+    _queue.join()
+
+
+def install(sender, connection, **kwargs):
+    # connection_created handler, fires again when a connection reconnects
+    if settings.SLOW_QUERY_LOG_ENABLED and slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_wrapper)
+
+
+class SlowQueryMiddleware:
+    """Tags slow queries with the route of the request that ran them."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            _context.route = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _context.route = request.resolver_match.route
+
+
+# full table scans in SQLite / PostgreSQL plans, the usual sign of a missing index
+FULL_SCAN = re.compile(r"\bSCAN (?:TABLE )?(\w+)|Seq Scan on (\w+)")
+
+
+def report(lines):
+    """Aggregate log lines per fingerprint, slowest total time first."""
+    groups = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        group = groups.setdefault(entry["fingerprint"], {
+            "fingerprint": entry["fingerprint"],
+            "sql": entry["sql"],
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "routes": set(),
+            "organizations": set(),
+            "plan": None,
+        })
+        group["count"] += 1
+        group["total_ms"] += entry["duration_ms"]
+        group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+        if entry.get("route"):
+            group["routes"].add(entry["route"])
+        if entry.get("organization_id") is not None:
+            group["organizations"].add(entry["organization_id"])
+        if entry.get("plan"):
+            group["plan"] = entry["plan"]
+
+    for group in groups.values():
+        group["full_scans"] = sorted({
+            table
+            for step in group["plan"] or []
+            for match in FULL_SCAN.finditer(step)
+            for table in match.groups() if table
+        })
+    return sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True)
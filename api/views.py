@@ -0,0 +1,20 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+
+from . import metrics
+
+
+@require_GET
+def prometheus_metrics(request):
+    # not served at all until a scrape token is configured
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    # the scrape token is no JWT, the authentication middleware's complaint doesn't count
+    request.jwt_error = None
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
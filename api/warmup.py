@@ -0,0 +1,23 @@
+import importlib
+from importlib.util import find_spec
+
+from django.urls import get_resolver
+
+# imported lazily by the code using them, so only pay for them up front when warming
+OPTIONAL_MODULES = ('msgpack', 'brotli', 'zstandard')
+
+
+def warm():
+    """
+    Do the one-off work of the first request ahead of time: import the
+    URLconf (building every operation's pydantic models and validators),
+    index the URL patterns and import the optional codecs. Run in the gunicorn
+    master with preload_app, workers fork with all of it already in memory.
+    Does not touch the database, connections must not be shared with forks.
+    """
+    resolver = get_resolver()
+    # reverse_dict is computed on first access and indexes every pattern
+    resolver.reverse_dict
+    for name in OPTIONAL_MODULES:
+        if find_spec(name) is not None:
+            importlib.import_module(name)
@@ -0,0 +1,306 @@
+import hashlib
+import hmac
+import ipaddress
+import json
+import random
+import secrets
+import socket
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Window
+from django.db.models.functions import Greatest, RowNumber
+from django.utils import timezone
+
+from . import metrics, sharding
+from .deletion import delete_in_batches
+from .models import OutboxEvent, WebhookDelivery, WebhookSubscription
+
+TASK_CREATED = "task.created"
+TASK_UPDATED = "task.updated"
+TASK_DELETED = "task.deleted"
+TASK_ARCHIVED = "task.archived"
+EVENT_TYPES = (TASK_CREATED, TASK_UPDATED, TASK_DELETED, TASK_ARCHIVED)
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+
+
+def get_cache():
+    return caches[settings.WEBHOOK_CACHE]
+
+
+def _cache_key(organization_id):
+    return f"subscribed:{organization_id}"
+
+
+def _load_subscribed_events(organization_id):
+    events = set()
+    for event_types in WebhookSubscription.all_objects.filter(
+        organization_id=organization_id, is_active=True
+    ).values_list('event_types', flat=True):
+        events.update(event_types or EVENT_TYPES)
+    return sorted(events)
+
+
+def subscribed_events(organization_id):
+    """
+    Event types the organization's active subscriptions want, kept in
+    WEBHOOK_CACHE for WEBHOOK_SUBSCRIPTION_CACHE_SECONDS. Subscription changes
+    overwrite the entry as soon as they are committed, but other processes
+    (and a read that raced the change) may use the old list until it expires.
+    """
+    cache = get_cache()
+    events = cache.get(_cache_key(organization_id))
+    metrics.record_cache_lookup(settings.WEBHOOK_CACHE, hit=events is not None)
+    if events is None:
+        events = _load_subscribed_events(organization_id)
+        cache.set(_cache_key(organization_id), events, settings.WEBHOOK_SUBSCRIPTION_CACHE_SECONDS)
+    return events
+
+
+def subscriptions_changed(organization_id):
+    """Call after the organization's subscriptions were created, changed or deleted."""
+    get_cache().set(
+        _cache_key(organization_id), _load_subscribed_events(organization_id), settings.WEBHOOK_SUBSCRIPTION_CACHE_SECONDS
+    )
+
+
+def clear_cache(organization_id=None):
+    if organization_id is None:
+        get_cache().clear()
+    else:
+        get_cache().delete(_cache_key(organization_id))
+
+
+@contextmanager
+def publishing(organization_id, event_type):
+    """
+    Transaction for a write that may publish `event_type`. The caller appends
+    each event's data to the yielded list and the events are inserted into
+    the outbox inside the same transaction, so an event exists exactly when
+    its change was committed. Organizations nobody listens to get neither a
+    transaction nor outbox rows.
+    """
+    if event_type not in subscribed_events(organization_id):
+        yield []
+        return
+
+    using = sharding.shard_for(organization_id)
+    events = []
+    with transaction.atomic(using=using):
+        yield events
+        OutboxEvent.all_objects.using(using).bulk_create([
+            OutboxEvent(organization_id=organization_id, event_type=event_type, data=data) for data in events
+        ])
+
+
+def task_data(task):
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "completed": task.completed,
+        "assigned_to": task.assigned_to_id,
+        "deadline_datetime_with_tz": task.deadline_datetime_with_tz,
+        "priority": task.priority,
+        "version": task.version,
+    }
+
+
+def is_allowed_address(address):
+    """
+    Whether webhooks may be sent to this IP: only global unicast addresses,
+    never loopback, private, link-local (which includes the cloud metadata
+    service at 169.254.169.254), reserved or multicast ones, unless
+    WEBHOOK_ALLOW_PRIVATE_NETWORKS is on.
+    """
+    if settings.WEBHOOK_ALLOW_PRIVATE_NETWORKS:
+        return True
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def check_addresses(hostname, addresses):
+    if not addresses:
+        raise ValueError(f"{hostname} does not resolve to any address")
+    refused = sorted({address for address in addresses if not is_allowed_address(address)})
+    if refused:
+        raise ValueError(f"{hostname} resolves to non-public addresses ({', '.join(refused)})")
+
+
+def check_url(url):
+    """Raise ValueError unless `url` is an http(s) URL whose host only resolves to allowed addresses."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("url must be an http or https URL")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"url host can't be resolved: {e}")
+    check_addresses(parts.hostname, [sockaddr[0] for *_, sockaddr in infos])
+
+
+def generate_secret():
+    return secrets.token_hex(32)
+
+
+def sign(secret, timestamp, body):
+    """X-Webhook-Signature value: HMAC-SHA256 over "<timestamp>.<body>", so a captured request can't be replayed later."""
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify(secret, header, body, tolerance=300, now=None):
+    """Receiver side of `sign`, for integrators and tests."""
+    parts = dict(part.split("=", 1) for part in header.split(",") if "=" in part)
+    try:
+        timestamp = int(parts["t"])
+    except (KeyError, ValueError):
+        return False
+    if abs((now or time.time()) - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), header)
+
+
+def render_batch(deliveries):
+    return json.dumps({
+        "events": [
+            {"id": d.event_id, "type": d.event_type, "created_at": d.event_created_at, "data": d.data}
+            for d in deliveries
+        ]
+    }, cls=DjangoJSONEncoder).encode()
+
+
+def databases():
+    return [DEFAULT_DB_ALIAS, *settings.DATABASE_SHARDS]
+
+
+def relay(using=DEFAULT_DB_ALIAS, batch_size=None):
+    """
+    Turn pending outbox events of one database into a WebhookDelivery per
+    matching subscription. A crash between the two steps only relays the
+    events again, and the unique (subscription, event) constraint drops the
+    duplicates.
+    """
+    batch_size = batch_size or settings.WEBHOOK_RELAY_BATCH_SIZE
+    events = list(OutboxEvent.all_objects.using(using).filter(dispatched_at__isnull=True).order_by('id')[:batch_size])
+    if not events:
+        return 0
+
+    subscriptions = {}
+    for subscription in WebhookSubscription.all_objects.filter(
+        organization_id__in={event.organization_id for event in events}, is_active=True
+    ):
+        subscriptions.setdefault(subscription.organization_id, []).append(subscription)
+
+    WebhookDelivery.all_objects.bulk_create([
+        WebhookDelivery(
+            subscription=subscription,
+            organization_id=event.organization_id,
+            event_id=event.id,
+            event_type=event.event_type,
+            data=event.data,
+            event_created_at=event.created_at,
+        )
+        for event in events
+        for subscription in subscriptions.get(event.organization_id, ())
+        if not subscription.event_types or event.event_type in subscription.event_types
+    ], ignore_conflicts=True)
+
+    OutboxEvent.all_objects.using(using).filter(id__in=[event.id for event in events]).update(dispatched_at=timezone.now())
+    return len(events)
+
+
+def claim(dispatcher_id, limit, batch_size=None, now=None):
+    """
+    Lease up to `limit` due deliveries for WEBHOOK_LEASE_SECONDS. The
+    conditional UPDATE acts as compare-and-swap, so dispatchers running side
+    by side never send the same delivery twice; a crashed dispatcher's lease
+    simply runs out.
+
+    Each subscription gets at most max_concurrency batches of `batch_size`,
+    all of which can be in flight at once, so a slow endpoint holds its
+    deliveries for about one timeout instead of outliving the lease while
+    its batches queue up, and leaves the rest of the round to the others.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+    lease = now + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS)
+    due = WebhookDelivery.all_objects.filter(status=WebhookDelivery.PENDING, next_attempt_at__lte=now)
+    ids = list(
+        due.annotate(position=Window(
+            RowNumber(), partition_by=F('subscription_id'), order_by=(F('next_attempt_at').asc(), F('id').asc())
+        ))
+        .filter(position__lte=Greatest(F('subscription__max_concurrency'), 1) * batch_size)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+
+    due.filter(id__in=ids).update(locked_by=dispatcher_id, next_attempt_at=lease)
+    return list(
+        WebhookDelivery.all_objects.select_related('subscription')
+        .filter(id__in=ids, locked_by=dispatcher_id, next_attempt_at=lease)
+        .order_by('id')
+    )
+
+
+def retry_delay(attempts, retry_after=None):
+    delay = min(settings.WEBHOOK_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.WEBHOOK_MAX_RETRY_DELAY_SECONDS)
+    delay *= random.uniform(1.0, 1.1)
+    # a receiver asking for more time gets it
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, settings.WEBHOOK_MAX_RETRY_DELAY_SECONDS))
+    return timedelta(seconds=delay)
+
+
+def record_result(deliveries, status=None, error="", retry_after=None, now=None):
+    """Store the outcome of one request carrying `deliveries`: delivered on 2xx, retried with backoff otherwise."""
+    now = now or timezone.now()
+    ids = [delivery.id for delivery in deliveries]
+    owned = WebhookDelivery.all_objects.filter(id__in=ids, locked_by=deliveries[0].locked_by)
+
+    if status is not None and 200 <= status < 300:
+        owned.update(
+            status=WebhookDelivery.DELIVERED, attempts=F('attempts') + 1, response_status=status,
+            error="", locked_by="", delivered_at=now,
+        )
+        return
+
+    fields = {"attempts": F('attempts') + 1, "response_status": status, "error": error[:1000], "locked_by": ""}
+    owned.filter(attempts__gte=settings.WEBHOOK_MAX_ATTEMPTS - 1).update(status=WebhookDelivery.FAILED, **fields)
+    attempts = max(delivery.attempts for delivery in deliveries) + 1
+    owned.filter(status=WebhookDelivery.PENDING).update(next_attempt_at=now + retry_delay(attempts, retry_after), **fields)
+
+
+def undelivered(organization_id):
+    """How many of the organization's events are not relayed yet or still have a pending delivery."""
+    return (
+        OutboxEvent.all_objects.using(sharding.shard_for(organization_id))
+        .filter(organization_id=organization_id, dispatched_at__isnull=True).count()
+        + WebhookDelivery.all_objects.filter(organization_id=organization_id, status=WebhookDelivery.PENDING).count()
+    )
+
+
+def purge_finished(batch_size=1000, now=None):
+    """Delete relayed outbox events and delivered or failed deliveries older than WEBHOOK_RETENTION_DAYS."""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.WEBHOOK_RETENTION_DAYS)
+    deleted = 0
+    for using in databases():
+        deleted += delete_in_batches(
+            OutboxEvent.all_objects.using(using).filter(dispatched_at__lt=cutoff), batch_size
+        )
+    deleted += delete_in_batches(
+        WebhookDelivery.all_objects.exclude(status=WebhookDelivery.PENDING).filter(created_at__lt=cutoff), batch_size
+    )
+    return deleted
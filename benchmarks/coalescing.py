@@ -0,0 +1,71 @@
+"""
+Thundering herd on one task list page: client threads send the same
+`GET /tasks` at once, round after round, with request coalescing off and on.
+Runs in-process against the WSGI handler, so the threads share one
+process like the threads of a gthread worker.
+
+    python benchmarks/coalescing.py [--tasks 5000] [--page 500] [--clients 16] [--rounds 20]
+"""
+import argparse
+import threading
+import time
+
+from common import percentile, seed_tenant, setup_django
+
+
+def herd(client_count, rounds, request):
+    latencies, coalesced = [], 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(client_count)
+
+    def run():
+        nonlocal coalesced
+        for _ in range(rounds):
+            barrier.wait()
+            start = time.perf_counter()
+            response = request()
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                coalesced += response.has_header("X-Coalesced")
+
+    threads = [threading.Thread(target=run) for _ in range(client_count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, coalesced, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django(RATE_LIMIT_ENABLED="False", METRICS_ENABLED="False")
+    from django.conf import settings
+    from django.test import Client
+
+    _, _, token = seed_tenant("bench", users=50, tasks=args.tasks)
+    path = f"/api/v1/tasks?limit={args.page}"
+
+    def request():
+        return Client().get(path, HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    request()
+    print(f"{'coalescing':>10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'view runs':>9}")
+    for enabled in (False, True):
+        settings.COALESCE_ENABLED = enabled
+        latencies, coalesced, elapsed = herd(args.clients, args.rounds, request)
+        print(
+            f"{'on' if enabled else 'off':>10} {len(latencies) / elapsed:>8.1f} "
+            f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 99):>8.1f} {len(latencies) - coalesced:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Shared setup for the benchmark scripts: a throwaway SQLite database and seeded tenants."""
+import os
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django(**settings_env):
+    """Point Django at a fresh SQLite file, migrate it and return its path."""
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+
+    path = Path(tempfile.mkdtemp(prefix="bench-")) / "bench.sqlite3"
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    os.environ.setdefault("DEBUG", "False")
+    for key, value in settings_env.items():
+        os.environ[key] = str(value)
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+    return path
+
+
+def seed_tenant(name, users=1, tasks=0, tier="standard"):
+    """Create an organization with users and tasks, returning (org, first user, bearer token)."""
+    import jwt
+    from django.conf import settings
+    from django.contrib.auth.hashers import make_password
+    from django.utils import timezone
+
+    from api.models import Organization, Task, User
+
+    org = Organization.objects.create(name=name, tier=tier)
+    password = make_password("password123")
+    members = User.all_objects.bulk_create([
+        User(username=f"{name}-{i}", password=password, organization=org) for i in range(users)
+    ])
+    members = list(User.all_objects.filter(organization=org).order_by("id"))
+
+    now = timezone.now()
+    Task.all_objects.bulk_create(
+        [
+            Task(
+                title=f"{name} task {i}",
+                description="Benchmark task " * 4,
+                completed=i % 5 == 0,
+                assigned_to=members[i % len(members)],
+                organization=org,
+                deadline_datetime_with_tz=now + timedelta(hours=i % 720),
+                priority=i % 5,
+            )
+            for i in range(tasks)
+        ],
+        batch_size=1000,
+    )
+
+    token = jwt.encode(
+        {"user_id": members[0].id, "exp": int((now + timedelta(hours=8)).timestamp())},
+        settings.SECRET_KEY,
+        algorithm="HS256",
+    )
+    return org, members[0], token
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
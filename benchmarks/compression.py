@@ -0,0 +1,51 @@
+"""
+CPU cost against bytes saved for compressing task list pages.
+
+Renders real `GET /tasks` pages once, then compresses each body with every
+available encoder (gzip always, br and zstd when brotli / zstandard are
+installed) at a few levels.
+
+    python benchmarks/compression.py [--tasks 2000] [--page 100] [--rounds 50]
+"""
+import argparse
+import time
+
+from common import seed_tenant, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--page", type=int, action="append", help="page sizes, default 20, 100 and 1000")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django(RATE_LIMIT_ENABLED="False", METRICS_ENABLED="False")
+    from django.test import Client
+
+    from api import compression
+
+    _, _, token = seed_tenant("bench", users=20, tasks=args.tasks)
+    client = Client()
+
+    print(f"{'page':>5} {'encoding':>8} {'level':>5} {'bytes':>9} {'ratio':>6} {'ms/page':>8} {'MB/s':>7}")
+    for page in args.page or [20, 100, 1000]:
+        body = client.get(f"/api/v1/tasks?limit={page}", HTTP_AUTHORIZATION=f"Bearer {token}").content
+        print(f"{page:>5} {'identity':>8} {'-':>5} {len(body):>9} {1.0:>6.2f} {0.0:>8.3f} {'-':>7}")
+
+        for name, encoder_class in compression.ENCODERS.items():
+            levels = {"gzip": [1, 6, 9], "br": [1, 5, 11], "zstd": [1, 3, 19]}[name]
+            for level in levels:
+                start = time.perf_counter()
+                for _ in range(args.rounds):
+                    encoder = encoder_class(level)
+                    compressed = encoder.compress(body) + encoder.finish()
+                elapsed = (time.perf_counter() - start) / args.rounds
+                print(
+                    f"{page:>5} {name:>8} {level:>5} {len(compressed):>9} {len(body) / len(compressed):>6.2f} "
+                    f"{elapsed * 1000:>8.3f} {len(body) / elapsed / 1e6:>7.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+MessagePack against JSON for task list pages: encode and decode time and
+body size, plus the full `GET /tasks` request with either Accept header.
+Needs msgpack installed.
+
+    python benchmarks/msgpack_vs_json.py [--tasks 2000] [--page 100] [--rounds 50]
+"""
+import argparse
+import json
+import time
+
+from common import seed_tenant, setup_django
+
+
+def timed(rounds, fn):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return result, (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--page", type=int, action="append", help="page sizes, default 20, 100 and 1000")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django(RATE_LIMIT_ENABLED="False", METRICS_ENABLED="False")
+    from django.test import Client
+    from django.test.client import RequestFactory
+
+    from api import formats
+    from api.api import api
+
+    if not formats.MSGPACK_AVAILABLE:
+        raise SystemExit("msgpack is not installed")
+
+    _, _, token = seed_tenant("bench", users=20, tasks=args.tasks)
+    client = Client()
+    auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+    json_request = RequestFactory().get("/")
+
+    print(f"{'page':>5} {'format':>8} {'bytes':>9} {'encode ms':>9} {'decode ms':>9} {'request ms':>10}")
+    for page in args.page or [20, 100, 1000]:
+        path = f"/api/v1/tasks?limit={page}"
+        # decoded from MessagePack so datetimes are datetime objects, as the renderer sees them
+        data = formats.unpackb(client.get(path, HTTP_ACCEPT="application/msgpack", **auth).content)
+
+        for name, accept in (("json", "application/json"), ("msgpack", "application/msgpack")):
+            if name == "json":
+                body, encode_ms = timed(args.rounds, lambda: api.renderer.render(json_request, data, response_status=200).encode())
+                _, decode_ms = timed(args.rounds, lambda: json.loads(body))
+            else:
+                body, encode_ms = timed(args.rounds, lambda: formats.packb(data))
+                _, decode_ms = timed(args.rounds, lambda: formats.unpackb(body))
+            _, request_ms = timed(args.rounds, lambda: client.get(path, HTTP_ACCEPT=accept, **auth))
+            print(f"{page:>5} {name:>8} {len(body):>9} {encode_ms:>9.3f} {decode_ms:>9.3f} {request_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Throughput and latency of `manage.py serve` per worker model on the task
+endpoints, plus the memory its workers use.
+
+Each mode starts a real gunicorn on a local port against a seeded SQLite
+database. Client threads keep one connection each and loop over
+`GET /tasks?limit=50` and `POST /tasks` for a fixed time. Memory is the
+proportional set size (shared pages split between the processes sharing
+them) summed over master and workers, so preloading shows up as savings.
+
+    python benchmarks/serving.py [--workers 2] [--clients 16] [--duration 10]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from common import ROOT, percentile, seed_tenant, setup_django
+
+MODES = [
+    ("sync", ["--worker-class", "sync"]),
+    ("gthread", ["--worker-class", "gthread"]),
+    ("gthread no preload", ["--worker-class", "gthread", "--no-preload"]),
+    ("uvicorn", ["--worker-class", "uvicorn"]),
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def pss_kb(pid):
+    """PSS of a process and its children, in kB (Linux only)."""
+    total = 0
+    pids = [pid]
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        pids += [int(child) for child in f.read().split()]
+    for p in pids:
+        with open(f"/proc/{p}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    total += int(line.split()[1])
+    return total
+
+
+def client(port, token, user_id, stop_at):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    body = json.dumps({
+        "title": "Load test",
+        "description": "Created by benchmarks/serving.py",
+        "assigned_to": user_id,
+        "deadline_datetime_with_tz": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "priority": 1,
+    })
+    samples = []
+    while time.monotonic() < stop_at:
+        for method, path, payload in (("GET", "/api/v1/tasks?limit=50", None), ("POST", "/api/v1/tasks", body)):
+            start = time.perf_counter()
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            samples.append((method, response.status, (time.perf_counter() - start) * 1000))
+    connection.close()
+    return samples
+
+
+def run(name, flags, args, token, user_id):
+    port = free_port()
+    env = {**os.environ, "RATE_LIMIT_ENABLED": "False", "SLOW_QUERY_LOG_ENABLED": "False"}
+    server = subprocess.Popen(
+        [sys.executable, "manage.py", "serve", "--workers", str(args.workers), "--bind", f"127.0.0.1:{port}", *flags],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(port)
+        # one round to get every worker past its first request
+        client(port, token, user_id, time.monotonic() + 1)
+        stop_at = time.monotonic() + args.duration
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            results = [pool.submit(client, port, token, user_id, stop_at) for _ in range(args.clients)]
+            samples = [sample for result in results for sample in result.result()]
+        memory = pss_kb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    errors = sum(1 for _, status, _ in samples if status != 200)
+    for method in ("GET", "POST"):
+        ms = [elapsed for m, _, elapsed in samples if m == method]
+        print(
+            f"{name:<20} {method:<5} {len(ms) / args.duration:>8.1f} {percentile(ms, 50):>8.1f} "
+            f"{percentile(ms, 99):>8.1f} {errors:>7} {memory / 1024:>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--mode", action="append", help="only these modes, by name")
+    args = parser.parse_args()
+
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="bench-metrics-")
+    setup_django()
+    _, user, token = seed_tenant("bench", users=20, tasks=args.tasks)
+
+    print(f"{'mode':<20} {'req':<5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'PSS MB':>8}")
+    for name, flags in MODES:
+        if args.mode and name not in args.mode:
+            continue
+        run(name, flags, args, token, user.id)
+
+
+if __name__ == "__main__":
+    main()
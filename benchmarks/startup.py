@@ -0,0 +1,84 @@
+"""
+Cold start of a worker: time to import the WSGI application, to serve the
+first `GET /tasks`, and from import to that response's first byte, with and
+without warming at startup. With gunicorn's preload_app the import happens
+once in the master, so each forked worker only pays the first request. Also
+times fetching the OpenAPI schema built per request against the file
+pre-generated by `manage.py generate_openapi`.
+
+Every sample is a fresh Python process.
+
+    python benchmarks/startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT, percentile, seed_tenant, setup_django
+
+WORKER = r"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from wsgiref.util import setup_testing_defaults
+from core.wsgi import application
+imported = time.perf_counter()
+
+def get(path, **headers):
+    environ = {"PATH_INFO": path, "HTTP_HOST": "localhost", **headers}
+    setup_testing_defaults(environ)
+    began = time.perf_counter()
+    body = application(environ, lambda status, headers: None)
+    # first byte: the response is ready to be written
+    first_byte = time.perf_counter()
+    b"".join(body)
+    return began, first_byte
+
+first_request, first_byte = get("/api/v1/tasks", HTTP_AUTHORIZATION="Bearer " + sys.argv[2])
+began, schema = get(sys.argv[3])
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (first_byte - first_request) * 1000,
+    "first_byte_ms": (first_byte - start) * 1000,
+    "schema_ms": (schema - began) * 1000,
+}))
+"""
+
+
+def run(token, schema_path, **env):
+    output = subprocess.run(
+        [sys.executable, "-c", WORKER, str(ROOT), token, schema_path],
+        env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    static_root = tempfile.mkdtemp(prefix="bench-static-")
+    setup_django(RATE_LIMIT_ENABLED="False", METRICS_ENABLED="False", ALLOWED_HOSTS="localhost", STATIC_ROOT=static_root)
+    from django.core.management import call_command
+
+    _, _, token = seed_tenant("bench", users=20, tasks=200)
+    call_command("generate_openapi", stdout=open(os.devnull, "w"))
+
+    modes = [
+        ("lazy, built schema", "/api/v1/openapi.json", {"WARMUP_ON_STARTUP": "False"}),
+        ("warm, built schema", "/api/v1/openapi.json", {"WARMUP_ON_STARTUP": "True"}),
+        ("warm, static schema", "/static/openapi.json", {"WARMUP_ON_STARTUP": "True"}),
+    ]
+    print(f"{'mode':<20} {'import ms':>10} {'1st request ms':>15} {'first byte ms':>14} {'schema ms':>10}")
+    for name, schema_path, env in modes:
+        samples = [run(token, schema_path, **env) for _ in range(args.runs)]
+        medians = {key: percentile(sorted(sample[key] for sample in samples), 50) for key in samples[0]}
+        print(f"{name:<20} {medians['import_ms']:>10.1f} {medians['first_request_ms']:>15.1f} {medians['first_byte_ms']:>14.1f} {medians['schema_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
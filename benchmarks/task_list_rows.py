@@ -0,0 +1,70 @@
+"""
+Memory and CPU of one task list page built from model instances validated
+by TaskSchema (the previous GET /tasks path) against values_list rows
+serialized directly (the current one). Both are rendered to JSON bytes.
+
+    python benchmarks/task_list_rows.py [--tasks 10000] [--users 50] [--rounds 5]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from common import seed_tenant, setup_django
+
+
+def measure(rounds, build):
+    """(ms per run, peak bytes traced during one run)."""
+    build()
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        build()
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+
+    gc.collect()
+    tracemalloc.start()
+    build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django(RATE_LIMIT_ENABLED="False", METRICS_ENABLED="False")
+    from django.test.client import RequestFactory
+
+    from api import models, rows, schemas
+    from api.api import api
+    from api.tenant import set_current_organization
+
+    org, _, _ = seed_tenant("bench", users=args.users, tasks=args.tasks)
+    set_current_organization(org)
+    request = RequestFactory().get("/")
+    page_schema = schemas.PagedTaskSchema
+
+    def models_path():
+        tasks = models.Task.objects.select_related('assigned_to__organization', 'organization').all()
+        page = page_schema.model_validate({"items": list(tasks[:args.tasks]), "count": tasks.count()}, from_attributes=True)
+        return api.renderer.render(request, page.model_dump(), response_status=200)
+
+    def rows_path():
+        tasks = rows.task_rows(models.Task.objects.all())
+        page = {"items": rows.serialize_tasks(tasks[:args.tasks]), "count": tasks.count()}
+        return api.renderer.render(request, page, response_status=200)
+
+    assert models_path() == rows_path()
+    print(f"{'path':>7} {'ms/page':>8} {'us/row':>7} {'peak MB':>8} {'bytes/row':>9}")
+    for name, build in (("models", models_path), ("rows", rows_path)):
+        elapsed, peak = measure(args.rounds, build)
+        print(f"{name:>7} {elapsed:>8.1f} {elapsed * 1000 / args.tasks:>7.1f} {peak / 2**20:>8.1f} {peak / args.tasks:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Load test: one tenant bursts while two others send steady traffic.
+
+A fixed pool of worker threads stands in for gunicorn workers, requests queue
+in front of it in arrival order. The quiet tenants' latency (queueing
+included) is reported with per-tenant limits disabled and enabled.
+
+    python benchmarks/tenant_fairness.py [--workers 4] [--burst 400]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import percentile, seed_tenant, setup_django
+
+
+def run(label, tokens, args):
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from api import ratelimit
+
+    limits = {
+        "standard": {"rate": args.rate, "burst": args.rate, "concurrency": args.concurrency},
+        "premium": {"rate": args.rate, "burst": args.rate, "concurrency": args.concurrency},
+    }
+    enabled = label == "limits on"
+    ratelimit.get_cache().clear()
+
+    def request(token, submitted):
+        response = Client().get("/api/v1/tasks?limit=50", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return response.status_code, time.perf_counter() - submitted
+
+    with override_settings(RATE_LIMIT_ENABLED=enabled, RATE_LIMITS=limits), \
+            ThreadPoolExecutor(max_workers=args.workers) as pool:
+        noisy = [pool.submit(request, tokens["noisy"], time.perf_counter()) for _ in range(args.burst)]
+        quiet = []
+        for _ in range(args.quiet_requests):
+            for name in ("quiet-a", "quiet-b"):
+                quiet.append(pool.submit(request, tokens[name], time.perf_counter()))
+            time.sleep(args.quiet_interval / 1000)
+
+        noisy_results = [f.result() for f in noisy]
+        quiet_results = [f.result() for f in quiet]
+
+    quiet_ms = [elapsed * 1000 for status, elapsed in quiet_results]
+    rejected = sum(1 for status, _ in noisy_results if status == 429)
+    print(
+        f"{label:>10}: quiet p50 {percentile(quiet_ms, 50):8.1f} ms  p99 {percentile(quiet_ms, 99):8.1f} ms  "
+        f"quiet non-200 {sum(1 for status, _ in quiet_results if status != 200):4d}  noisy 429s {rejected:4d}/{args.burst}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--burst", type=int, default=400)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--quiet-requests", type=int, default=50)
+    parser.add_argument("--quiet-interval", type=float, default=100, help="ms between quiet requests")
+    parser.add_argument("--rate", type=int, default=20, help="per-tenant requests/second when limits are on")
+    parser.add_argument("--concurrency", type=int, default=3, help="per-tenant in-flight cap when limits are on")
+    args = parser.parse_args()
+
+    setup_django()
+    tokens = {name: seed_tenant(name, users=5, tasks=args.tasks)[2] for name in ("noisy", "quiet-a", "quiet-b")}
+
+    for label in ("limits off", "limits on"):
+        run(label, tokens, args)
+
+
+if __name__ == "__main__":
+    main()
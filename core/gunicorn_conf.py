@@ -0,0 +1,69 @@
+"""
+Gunicorn configuration, built from the SERVER_* settings.
+
+    gunicorn -c python:core.gunicorn_conf core.wsgi:application
+
+`manage.py serve` runs exactly that, with the ASGI application for uvicorn
+workers.
+"""
+
+import gc
+import os
+from importlib.util import find_spec
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+from django.conf import settings  # noqa: E402
+
+# SERVER_WORKER_CLASS -> (gunicorn worker class, application)
+WORKER_CLASSES = {
+    'sync': ('sync', 'core.wsgi:application'),
+    'gthread': ('gthread', 'core.wsgi:application'),
+    'uvicorn': (
+        # uvicorn.workers is deprecated in favour of the uvicorn-worker package
+        'uvicorn_worker.UvicornWorker' if find_spec('uvicorn_worker') else 'uvicorn.workers.UvicornWorker',
+        'core.asgi:application',
+    ),
+}
+
+worker_class, wsgi_app = WORKER_CLASSES[settings.SERVER_WORKER_CLASS]
+bind = settings.SERVER_BIND
+workers = settings.SERVER_WORKERS
+threads = settings.SERVER_THREADS if settings.SERVER_WORKER_CLASS == 'gthread' else 1
+preload_app = settings.SERVER_PRELOAD
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = settings.SERVER_MAX_REQUESTS_JITTER
+keepalive = settings.SERVER_KEEPALIVE
+timeout = settings.SERVER_TIMEOUT
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT
+accesslog = '-'
+
+
+def on_starting(server):
+    # counters left by the previous run's workers would be summed into this one's
+    from api import metrics
+
+    metrics.clear()
+
+
+def when_ready(server):
+    # runs in the master after preloading, right before the first fork: move
+    # everything allocated so far out of the collector's reach, so collections
+    # in workers don't write to (and copy) pages shared with the master
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+
+
+def pre_fork(server, worker):
+    # never hand a database connection opened in the master to a worker
+    from django.db import connections
+
+    connections.close_all()
+
+
+def child_exit(server, worker):
+    # runs in the master once a worker is gone, its metric files are folded into one
+    from api import metrics
+
+    metrics.mark_process_dead(worker.pid)
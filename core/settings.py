@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 from decouple import config, Csv
@@ -49,7 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.compression.CompressionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +61,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'api.middleware.JWTAuthenticationMiddleware',
     'api.middleware.OrganizationContextMiddleware',
+    'api.coalesce.CoalescingMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'api.slowlog.SlowQueryMiddleware',
+    'api.middleware.IdempotencyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -92,6 +100,47 @@ DATABASES = {
     )
 }
 
+# extra databases for tenant data, e.g. "shard1=sqlite:///shard1.sqlite3,shard2=postgres://..."
+# organizations are placed on them with `manage.py move_organization`
+DATABASE_SHARDS = []
+for shard in config('SHARD_DATABASE_URLS', default='', cast=Csv()):
+    alias, url = shard.split('=', 1)
+    DATABASES[alias] = dj_database_url.parse(url)
+    DATABASE_SHARDS.append(alias)
+
+DATABASE_ROUTERS = ['api.sharding.ShardRouter']
+# adds the "shard1" database the sharding tests move organizations to
+TEST_RUNNER = 'core.test_runner.TestRunner'
+AUTHENTICATION_BACKENDS = ['api.sharding.ShardedModelBackend']
+
+# how long processes may use a cached organization -> shard mapping, moves wait this long between steps
+SHARD_MAP_CACHE_SECONDS = config('SHARD_MAP_CACHE_SECONDS', default=5, cast=int)
+# ids of users and tasks created on shard N start at N * SHARD_ID_BLOCK
+SHARD_ID_BLOCK = 10 ** 12
+
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # needs atomic increments, RedisCache or PyMemcacheCache shared by all workers in production;
+    # the default local memory enforces the limits per worker process (see api/checks.py)
+    "ratelimit": {
+        "BACKEND": config('RATE_LIMIT_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        "LOCATION": config('RATE_LIMIT_CACHE_LOCATION', default='ratelimit'),
+    },
+    # when shared (Redis), processes check a revocation counter in it instead of the RevokedToken table
+    "revocation": {
+        "BACKEND": config('REVOCATION_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        "LOCATION": config('REVOCATION_CACHE_LOCATION', default='revocation'),
+    },
+    # which organizations have webhook subscriptions, per process unless configured otherwise
+    "webhooks": {
+        "BACKEND": config('WEBHOOK_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        "LOCATION": config('WEBHOOK_CACHE_LOCATION', default='webhooks'),
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,8 +188,107 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 JWT_ALGORITHM = config('JWT_ALGORITHM', default='HS256')
 JWT_EXPIRATION_HOURS = config('JWT_EXPIRATION_HOURS', default=8, cast=int)
 
+# revoked token IDs, see api.revocation: how often each process checks for new revocations,
+# rebuilds its Bloom filter, and how the filter is sized
+REVOCATION_CACHE = 'revocation'
+REVOCATION_SYNC_SECONDS = config('REVOCATION_SYNC_SECONDS', default=2, cast=float)
+REVOCATION_REBUILD_SECONDS = config('REVOCATION_REBUILD_SECONDS', default=3600, cast=int)
+REVOCATION_FILTER_CAPACITY = config('REVOCATION_FILTER_CAPACITY', default=100000, cast=int)
+REVOCATION_FILTER_ERROR_RATE = 0.001
+
+JOB_LEASE_SECONDS = config('JOB_LEASE_SECONDS', default=300, cast=int)
+JOB_RETRY_BACKOFF_SECONDS = config('JOB_RETRY_BACKOFF_SECONDS', default=10, cast=int)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1.0, cast=float)
+# how often a purge checks whether the dispatcher has finished its task.deleted deliveries
+PURGE_WEBHOOK_WAIT_SECONDS = config('PURGE_WEBHOOK_WAIT_SECONDS', default=30, cast=int)
+
+# webhook dispatcher, see api/dispatcher.py
+WEBHOOK_BATCH_SIZE = config('WEBHOOK_BATCH_SIZE', default=50, cast=int)
+WEBHOOK_MAX_CONCURRENCY = config('WEBHOOK_MAX_CONCURRENCY', default=50, cast=int)
+WEBHOOK_TIMEOUT_SECONDS = config('WEBHOOK_TIMEOUT_SECONDS', default=10.0, cast=float)
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=10, cast=int)
+WEBHOOK_RETRY_BACKOFF_SECONDS = config('WEBHOOK_RETRY_BACKOFF_SECONDS', default=10, cast=int)
+WEBHOOK_MAX_RETRY_DELAY_SECONDS = config('WEBHOOK_MAX_RETRY_DELAY_SECONDS', default=3600, cast=int)
+WEBHOOK_LEASE_SECONDS = config('WEBHOOK_LEASE_SECONDS', default=120, cast=int)
+WEBHOOK_POLL_INTERVAL = config('WEBHOOK_POLL_INTERVAL', default=1.0, cast=float)
+WEBHOOK_RELAY_BATCH_SIZE = config('WEBHOOK_RELAY_BATCH_SIZE', default=1000, cast=int)
+WEBHOOK_RETENTION_DAYS = config('WEBHOOK_RETENTION_DAYS', default=7, cast=int)
+# lets subscriptions reach loopback and private addresses, for local development only
+WEBHOOK_ALLOW_PRIVATE_NETWORKS = config('WEBHOOK_ALLOW_PRIVATE_NETWORKS', default=False, cast=bool)
+WEBHOOK_CACHE = 'webhooks'
+# how long other processes may miss a subscription change, and publish or skip events by the old subscriptions
+WEBHOOK_SUBSCRIPTION_CACHE_SECONDS = config('WEBHOOK_SUBSCRIPTION_CACHE_SECONDS', default=5, cast=int)
+
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+# how long a request holds its key before a retry may run it again, keep it above SERVER_TIMEOUT
+IDEMPOTENCY_LOCK_SECONDS = config('IDEMPOTENCY_LOCK_SECONDS', default=60, cast=int)
+IDEMPOTENT_PATHS = ['/api/v1/tasks', '/api/v1/users/']
+
+# longest from..to range of GET /tasks/calendar
+TASK_CALENDAR_MAX_DAYS = config('TASK_CALENDAR_MAX_DAYS', default=366, cast=int)
+
+# identical concurrent GETs of these paths within one organization share one response
+COALESCE_ENABLED = config('COALESCE_ENABLED', default=True, cast=bool)
+COALESCE_PATHS = ['/api/v1/tasks', '/api/v1/users/']
+COALESCE_WAIT_SECONDS = config('COALESCE_WAIT_SECONDS', default=5.0, cast=float)
+
+# completed tasks older than this move to ArchivedTask, Organization.task_retention_days overrides it
+TASK_ARCHIVE_RETENTION_DAYS = config('TASK_ARCHIVE_RETENTION_DAYS', default=90, cast=int)
+
+# rows per INSERT/COPY batch for POST /tasks/import, and how many failed rows the report lists
+TASK_IMPORT_BATCH_SIZE = config('TASK_IMPORT_BATCH_SIZE', default=1000, cast=int)
+TASK_IMPORT_MAX_ERRORS = config('TASK_IMPORT_MAX_ERRORS', default=100, cast=int)
+
+BATCH_MAX_OPERATIONS = config('BATCH_MAX_OPERATIONS', default=20, cast=int)
+
+OFFBOARD_BATCH_SIZE = config('OFFBOARD_BATCH_SIZE', default=5000, cast=int)
+
+# one file per worker process/thread, summed by /metrics; clear it when the server starts
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'api-metrics'))
+# bearer token Prometheus scrapes /metrics with, the endpoint answers 404 while it is empty
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# cProfile a fraction of requests, plus any request with a signed X-Profile header (manage.py profile_token)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_DIR = config('PROFILING_DIR', default=os.path.join(tempfile.gettempdir(), 'api-profiles'))
+PROFILING_MAX_FILES = config('PROFILING_MAX_FILES', default=200, cast=int)
+PROFILING_TOKEN_MAX_AGE = config('PROFILING_TOKEN_MAX_AGE', default=3600, cast=int)
+
+# queries slower than this are appended to SLOW_QUERY_LOG with their plan, see manage.py slow_query_report
+SLOW_QUERY_LOG_ENABLED = config('SLOW_QUERY_LOG_ENABLED', default=True, cast=bool)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+SLOW_QUERY_LOG = config('SLOW_QUERY_LOG', default=os.path.join(tempfile.gettempdir(), 'api-slow-queries.ndjson'))
+
+# response compression, negotiated from Accept-Encoding (zstd and br need the zstandard / brotli packages)
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+# only these content types are compressed, at these levels
+COMPRESSION_LEVELS = {
+    'application/json': {'zstd': 3, 'br': 5, 'gzip': 6},
+    # streamed and flushed per chunk, a cheaper level keeps up with the producer
+    'application/x-ndjson': {'zstd': 1, 'br': 3, 'gzip': 4},
+    'application/msgpack': {'zstd': 3, 'br': 5, 'gzip': 6},
+    'text/plain': {'zstd': 3, 'br': 5, 'gzip': 6},
+    'text/csv': {'zstd': 3, 'br': 5, 'gzip': 6},
+    'text/html': {'zstd': 3, 'br': 5, 'gzip': 6},
+}
+
+# per organization tier: sustained requests/second, burst size and requests in flight
+RATE_LIMIT_ENABLED = config('RATE_LIMIT_ENABLED', default=True, cast=bool)
+RATE_LIMIT_CACHE = 'ratelimit'
+RATE_LIMIT_INFLIGHT_TTL = 60
+RATE_LIMITS = {
+    'standard': {'rate': 50, 'burst': 100, 'concurrency': 8},
+    'premium': {'rate': 200, 'burst': 400, 'concurrency': 32},
+}
+
 STATIC_URL = 'static/'
-STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATIC_ROOT = config('STATIC_ROOT', default=str(BASE_DIR / 'staticfiles'))
+
+# written by `manage.py generate_openapi`, served from STATIC_ROOT
+OPENAPI_SCHEMA_NAME = 'openapi.json'
+# build routes and schemas when the WSGI/ASGI application is created instead of on the first request
+WARMUP_ON_STARTUP = config('WARMUP_ON_STARTUP', default=True, cast=bool)
 
 STORAGES = {
     "default": {
@@ -149,4 +297,19 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
-}
\ No newline at end of file
+}
+# `manage.py serve` / core/gunicorn_conf.py: sync, gthread or uvicorn workers (uvicorn needs the uvicorn-worker package)
+SERVER_WORKER_CLASS = config('SERVER_WORKER_CLASS', default='gthread')
+SERVER_BIND = config('SERVER_BIND', default=f"0.0.0.0:{config('PORT', default=8000, cast=int)}")
+SERVER_WORKERS = config('WEB_CONCURRENCY', default=(os.cpu_count() or 1) * 2, cast=int)
+SERVER_THREADS = config('SERVER_THREADS', default=4, cast=int)
+# import and warm the app once in the master, workers share that memory copy-on-write
+SERVER_PRELOAD = config('SERVER_PRELOAD', default=True, cast=bool)
+# recycle workers after this many requests, jittered so they don't all restart at once
+SERVER_MAX_REQUESTS = config('SERVER_MAX_REQUESTS', default=5000, cast=int)
+SERVER_MAX_REQUESTS_JITTER = config('SERVER_MAX_REQUESTS_JITTER', default=500, cast=int)
+# seconds an idle keep-alive connection stays open, keep it above the load balancer's idle timeout
+SERVER_KEEPALIVE = config('SERVER_KEEPALIVE', default=75, cast=int)
+SERVER_TIMEOUT = config('SERVER_TIMEOUT', default=30, cast=int)
+# seconds workers get to finish in-flight requests after SIGTERM
+SERVER_GRACEFUL_TIMEOUT = config('SERVER_GRACEFUL_TIMEOUT', default=30, cast=int)
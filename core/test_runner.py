@@ -0,0 +1,23 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+
+# tests that move organizations between databases use this one
+SHARD_ALIAS = "shard1"
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Declares a second SQLite database standing in for a shard before the
+    test databases are set up, so it is created and migrated like the
+    default one. It is never listed in DATABASE_SHARDS, sharding tests opt in
+    with override_settings.
+    """
+
+    def setup_databases(self, **kwargs):
+        default = connections.settings[DEFAULT_DB_ALIAS]
+        connections.settings.setdefault(SHARD_ALIAS, {
+            **default,
+            "NAME": f"{SHARD_ALIAS}.sqlite3",
+            "TEST": {**default["TEST"], "NAME": None},
+        })
+        return super().setup_databases(**kwargs)
@@ -17,10 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from api.api import api
+from api.views import prometheus_metrics
 
 version = "v1"
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path(f'api/{version}/', api.urls)
+    path(f'api/{version}/', api.urls),
+    path('metrics', prometheus_metrics),
 ]